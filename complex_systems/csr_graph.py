@@ -0,0 +1,157 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# -------------------------------------------------------------------------------
+# Copyright (c) 2012 Vincent Gauthier.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+# -------------------------------------------------------------------------------
+
+__author__ = """\n""".join(['Vincent Gauthier'])
+
+__all__ = ['CSRGraph']
+
+import numpy as N
+
+
+class CSRGraph:
+
+    '''
+    Frozen compressed sparse row (CSR) view of an undirected networkx graph.
+
+    Node labels are mapped onto the contiguous indices ``0 .. N-1`` in the
+    order of ``nodes``, and the neighbors of node ``i`` are stored in
+    ``indices[offsets[i]:offsets[i+1]]``.
+
+    :Example:
+    >>> import networkx as nx
+    >>> G = nx.path_graph(3)
+    >>> csr = CSRGraph(G)
+    >>> csr.neighbors(1)
+    array([0, 2], dtype=int32)
+
+    :Parameters:
+    - `G` : networkx.Graph
+        graph to freeze
+    - `nodes` : list (default G.nodes())
+        node ordering, every node of G must appear exactly once
+    - `weight` : str (default None)
+        edge attribute stored in ``weights``, aligned with ``indices``
+        (edges without the attribute get a weight of 1)
+    '''
+
+    def __init__(self, G, nodes=None, weight=None):
+        if nodes is None:
+            nodes = G.nodes()
+        self.nodes = list(nodes)
+        self.index = dict((nd, i) for (i, nd) in enumerate(self.nodes))
+        if len(self.index) != len(G) or len(self.nodes) != len(G):
+            raise ValueError('The node ordering must contain every node of the graph exactly once.')
+
+        nb_node = len(self.nodes)
+        self.degree = N.zeros(nb_node, dtype=N.int32)
+        indices = []
+        weights = []
+        for (i, nd) in enumerate(self.nodes):
+            nbrs = [self.index[nb] for nb in G.adj[nd]]
+            self.degree[i] = len(nbrs)
+            indices.extend(nbrs)
+            if weight is not None:
+                weights.extend(data.get(weight, 1.0) for data in
+                               G.adj[nd].itervalues())
+        self.offsets = N.zeros(nb_node + 1, dtype=N.int32)
+        N.cumsum(self.degree, out=self.offsets[1:])
+        self.indices = N.array(indices, dtype=N.int32)
+        self.weights = None
+        if weight is not None:
+            self.weights = N.array(weights, dtype=N.float64)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def neighbors(self, i):
+        '''
+        Return the indices of the neighbors of the node of index i
+        '''
+
+        return self.indices[self.offsets[i]:self.offsets[i + 1]]
+
+    def out_edges(self, nodes):
+        '''
+        Return the source and the position in ``indices`` of every edge of
+        the nodes of the given indices, as two arrays
+
+        :Example:
+        >>> import networkx as nx
+        >>> csr = CSRGraph(nx.path_graph(3))
+        >>> (sources, positions) = csr.out_edges([0, 1])
+        >>> sources, csr.indices[positions]
+        (array([0, 1, 1]), array([1, 0, 2], dtype=int32))
+        '''
+
+        nodes = N.asarray(nodes, dtype=N.int64)
+        degree = self.degree[nodes]
+        sources = N.repeat(nodes, degree)
+        first = N.cumsum(degree) - degree
+        positions = N.arange(len(sources)) + N.repeat(self.offsets[nodes]
+                - first, degree)
+        return (sources, positions)
+
+    def reverse_edges(self):
+        '''
+        Return for every edge the position in ``indices`` of the same edge
+        in the opposite direction
+        '''
+
+        nb_node = len(self.nodes)
+        sources = N.repeat(N.arange(nb_node, dtype=N.int64), self.degree)
+        key = sources * nb_node + self.indices
+        order = N.argsort(key)
+        return order[N.searchsorted(key[order], self.indices
+                     * N.int64(nb_node) + sources)]
+
+    def edge(self, i, j):
+        '''
+        Return the position in ``indices`` of the edge from the node of
+        index i to the node of index j, raise a KeyError when the two nodes
+        are not connected
+        '''
+
+        k = N.flatnonzero(self.neighbors(i) == j)
+        if len(k) == 0:
+            raise KeyError((self.nodes[i], self.nodes[j]))
+        return self.offsets[i] + k[0]
+
+    def adjacency(self, self_loops=False):
+        '''
+        Return the adjacency matrix as a scipy.sparse CSR matrix
+
+        :Parameters:
+        - `self_loops` : bool (default False)
+            add the identity to the adjacency matrix, i.e. return A+I
+        '''
+
+        import scipy.sparse as sparse
+        nb_node = len(self.nodes)
+        A = sparse.csr_matrix((N.ones(len(self.indices)), self.indices,
+                              self.offsets), shape=(nb_node, nb_node))
+        if self_loops:
+            A = (A + sparse.identity(nb_node, format='csr')).tocsr()
+        return A
@@ -27,14 +27,32 @@
 
 __author__ = """\n""".join(['Vincent Gauthier'])
 
+import heapq
 import networkx as nx
-import random as RD
 import pylab as P
 import numpy as N
+from complex_systems.csr_graph import CSRGraph
+from complex_systems.dynamics import COOPERATOR, STRATEGY_LABELS
+
+# Node states of the dissemination, indexed by the value of the state array
+
+_STATE_LABELS = ('S', 'I')
 
 class Diffusion(object):
 
-    """docstring for Diffusion"""
+    """
+    Dissemination of a time stamp from the infected cooperators to their
+    neighbors, each edge transmitting with the probability of its weight.
+
+    The states, time stamps and strategies of the nodes are stored in
+    arrays indexed by the nodes of the CSR view of the graph, so the
+    topology can be swapped with rebind.
+
+    A step is synchronous: every infected cooperator of the frontier, the
+    ones with an edge toward a susceptible neighbor or toward a neighbor
+    with another time stamp, tries all these edges at once against the
+    state at the beginning of the step.
+    """
 
     def __init__(
         self,
@@ -44,24 +62,25 @@ class Diffusion(object):
         initial_infection_rate=0.0,
         initial_time_stamp=0.0, 
         strategies = None,
+        seed=None,
         ):
 
         super(Diffusion, self).__init__()
         
-        self._G = G
+        self._random = N.random.RandomState(seed)
+        self._set_topology(G)
         self._initial_infection_rate = initial_infection_rate
         self._initial_time_stamp = initial_time_stamp
         self._nb_simulation_step = nb_simulation_step
         self._time_step = float(time_step) / nb_simulation_step
+        nb_node = len(self._csr)
+        self._strategies = N.empty(nb_node, dtype=N.int8)
         self.set_strategies(strategies)
 
-        for node in self._G.nodes():
-            if RD.random() < initial_infection_rate:
-                self._G.node[node]['state'] = 'I'
-                self._G.node[node]['time_stamp'] = initial_time_stamp
-            else:
-                self._G.node[node]['state'] = 'S'
-                self._G.node[node]['time_stamp'] = initial_time_stamp
+        self._states = (self._random.random_sample(nb_node)
+                        < initial_infection_rate).astype(N.int8)
+        self._time_stamps = N.empty(nb_node, dtype=N.float64)
+        self._time_stamps.fill(initial_time_stamp)
 
     def run_steps(self, infected_node):
         self.set_infected(infected_node)
@@ -71,91 +90,366 @@ class Diffusion(object):
                                 + i * self._nb_simulation_step)
 
     def diffusion_step(self):
-        H = self._G.copy()
-        node_list = H.nodes()
-        RD.shuffle(node_list)
-        for node in node_list:
-            if H.node[node]['state'] == 'I' and H.node[node]['strategy'] == 'C':
-                neighbors = H.neighbors(node)
-                for neighbor in neighbors:
-                    if RD.random() \
-                        < H.edge[node][neighbor]['weight']:
-                        if H.node[neighbor]['state'] == 'S':
-                            H.node[neighbor]['state'] = 'I'
-                            H.node[neighbor]['time_stamp'] = \
-                                H.node[node]['time_stamp']
-                        else:
-                            max_time_stamp = \
-                                max(H.node[neighbor]['time_stamp'
-                                    ], H.node[node]['time_stamp'])
-                            H.node[neighbor]['time_stamp'] = \
-                                max_time_stamp
-                            H.node[node]['time_stamp'] = \
-                                max_time_stamp
-        self._G = H.copy()
+        '''
+        Let the infected cooperators of the frontier transmit on all their
+        active edges, each edge with the probability of its weight. A
+        susceptible node gets infected with the largest time stamp of the
+        nodes reaching it, two infected nodes both take the largest of
+        their time stamps.
+        '''
+
+        if self._frontier is None:
+            self._frontier = N.flatnonzero(self._states
+                    & (self._strategies == COOPERATOR))
+        states = self._states
+        time_stamps = self._time_stamps
+        (src, edge) = self._csr.out_edges(self._frontier)
+        dst = self._csr.indices[edge]
+        active = (states[dst] == 0) | (time_stamps[dst] != time_stamps[src])
+        (src, edge, dst) = (src[active], edge[active], dst[active])
+        live = N.unique(src)
+
+        hit = self._random.random_sample(len(edge)) \
+            < self._csr.weights[edge]
+
+        # The nodes that changed and their neighbors may have new active
+        # edges, the others left the frontier with their last active edge
+
+        self._frontier = live
+        self._transmit(src[hit], dst[hit])
+
+    def rebind(self, G):
+        '''
+        Run the next steps on the graph G, e.g. the next slice of a DyGraph,
+        keeping the states, the time stamps and the strategies of the nodes
+
+        :Parameters:
+        - `G` : networkx.Graph
+            new topology, with the same nodes as the current graph
+        '''
+
+        self._set_topology(G, self._csr.nodes)
 
     #
     # Set
     #
     def set_nodes_states(self, nodes_states):
         for (key, val) in nodes_states.iteritems():
-            self._G.node[key]['state'] = val
+            self._states[self._csr.index[key]] = val == 'I'
+        self._frontier = None
 
     def set_node_time_stamps(self, time_stamps):
         for (key, val) in time_stamps.iteritems():
-            self._G.node[key]['time_stamp'] = val 
+            self._time_stamps[self._csr.index[key]] = val 
+        self._frontier = None
 
     def set_time_stamp(self, node_id, time_stamp):
-        self._G.node[node_id]['state'] = 'I'
-        self._G.node[node_id]['time_stamp'] = time_stamp
+        '''
+        infect the node, or the list of nodes, with the time stamp
+        '''
+        if type(node_id) == list:
+            i = [self._csr.index[node] for node in node_id]
+        else:
+            i = [self._csr.index[node_id]]
+        self._states[i] = 1
+        self._time_stamps[i] = time_stamp
+        self._add_to_frontier(i)
 
     def set_weight(self, weights):
         for (item, val) in weights.iteritems():
-            (node_s, node_d) = item
-            self._G.edge[node_s][node_d]['weight'] = val
+            (node_s, node_d) = (self._csr.index[item[0]],
+                                self._csr.index[item[1]])
+            self._csr.weights[self._csr.edge(node_s, node_d)] = val
+            self._csr.weights[self._csr.edge(node_d, node_s)] = val
+        self._frontier = None
 
     def set_strategies(self, strategies):
         '''
         initialize the strategy of a node in the graph
         '''
         if strategies != None:
-            for node in self._G.nodes():
-                self._G.node[node]['strategy'] = strategies[node]
+            self._strategies[:] = [strategies[node] == 'C' for node in
+                                   self._csr.nodes]
         else:
-            for node in self._G.nodes():
-                self._G.node[node]['strategy'] = 'C'
+            self._strategies.fill(COOPERATOR)
+        self._frontier = None
 
     def set_infected(self, infected_node):
         '''
         initialize the infected node in the graph 
         '''
-        time_stamp = self._initial_time_stamp
-        if type(infected_node) == list:
-            for node in infected_node.iteritems():
-                self._G.node[node]['state'] = 'I'
-                self._G.node[node]['time_stamp'] = time_stamp
-        else:
-            self._G.node[infected_node]['state'] = 'I'
-            self._G.node[infected_node]['time_stamp'] = time_stamp
+        self.set_time_stamp(infected_node, self._initial_time_stamp)
 
     #
     # Get 
     #
     def get_number_infected(self):
-        infected = 0
-        for node in self._G.nodes():
-            if self._G.node[node]['state'] == 'I':
-                infected += 1
-        return infected
+        return int(N.count_nonzero(self._states))
 
     def get_time_stamps(self):
-        time_stamps = {}
-        for node in self._G.nodes():
-            time_stamps[node] = self._G.node[node]['time_stamp']
-        return time_stamps
+        return dict(zip(self._csr.nodes, self._time_stamps.tolist()))
 
     def get_states(self):
-        states = {}
-        for node in self._G.nodes():
-            states[node] = self._G.node[node]['state']
-        return states
\ No newline at end of file
+        return dict(zip(self._csr.nodes, [_STATE_LABELS[s] for s in
+                    self._states]))
+
+    def get_strategies(self):
+        return dict(zip(self._csr.nodes, [STRATEGY_LABELS[s] for s in
+                    self._strategies]))
+
+    # ####################
+    # Private Methodes
+    # ####################
+
+    def _set_topology(self, G, nodes=None):
+        self._G = G
+        self._csr = CSRGraph(G, nodes, weight='weight')
+        self._frontier = None
+
+    def _transmit(self, src, dst):
+        '''
+        Apply at once the transmissions on the edges src -> dst, all against
+        the state at the beginning of the step, and pass the nodes that
+        changed to _add_to_frontier
+        '''
+
+        (states, time_stamps) = (self._states, self._time_stamps)
+        (src_time_stamps, dst_time_stamps) = (time_stamps[src],
+                time_stamps[dst])
+        new = states[dst] == 0
+        infected = dst[new]
+        time_stamps[infected] = -N.inf
+        N.maximum.at(time_stamps, infected, src_time_stamps[new])
+        states[infected] = 1
+        N.maximum.at(time_stamps, dst[~new], src_time_stamps[~new])
+        N.maximum.at(time_stamps, src[~new], dst_time_stamps[~new])
+        self._add_to_frontier(N.concatenate([infected, dst[~new],
+                              src[~new]]))
+
+    def _add_to_frontier(self, changed):
+        '''
+        Add to the frontier the nodes whose state or time stamp changed and
+        their neighbors, keeping the infected cooperators only
+        '''
+
+        if self._frontier is None:
+            return
+        changed = N.unique(N.asarray(changed, dtype=N.int64))
+        neighbors = self._csr.indices[self._csr.out_edges(changed)[1]]
+        frontier = N.unique(N.concatenate([self._frontier, changed,
+                            neighbors]))
+        self._frontier = frontier[(self._states[frontier] == 1)
+                                  & (self._strategies[frontier]
+                                  == COOPERATOR)]
+
+
+class GillespieDiffusion(Diffusion):
+
+    """
+    Event driven version of Diffusion, with the same law.
+
+    An active edge of weight w, from an infected cooperator toward a
+    susceptible neighbor or toward a neighbor holding another time stamp,
+    transmits at every step with the probability w, so the number of steps
+    until it transmits is geometric of parameter w. The step of the next
+    transmission of every active edge is kept in a priority queue, and only
+    the steps with transmissions are processed: the transmissions of a step
+    are applied at once against the state at the beginning of the step, as
+    in Diffusion.diffusion_step. As the draws of the steps are independent,
+    an edge is only scheduled again when it transmits or when one of its two
+    nodes changes.
+
+    diffusion_step plays one step, so run_steps and the get_states /
+    get_time_stamps outputs follow the law of Diffusion, each diffusion_step
+    crossing at most one hop.
+
+    :Example:
+    >>> import networkx as nx
+    >>> G = nx.path_graph(3)
+    >>> D = GillespieDiffusion(G, time_step=1.0, nb_simulation_step=1)
+    >>> D.set_weight({(0, 1): 0.5, (1, 2): 0.5})
+    >>> D.set_infected(0)
+    >>> D.advance(1000)
+    >>> D.get_states()
+    {0: 'I', 1: 'I', 2: 'I'}
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._time = 0
+        super(GillespieDiffusion, self).__init__(*args, **kwargs)
+
+    def diffusion_step(self):
+        self.advance(self._time + 1)
+
+    def advance(self, time):
+        '''
+        Play the steps up to the given step, skipping the steps without
+        transmission
+
+        :Parameters:
+        - `time` : int
+            last step played
+        '''
+
+        if self._frontier is None:
+            self._schedule_all()
+        events = self._events
+        while len(events) > 0 and events[0][0] <= time:
+            step = events[0][0]
+            edges = []
+            while len(events) > 0 and events[0][0] == step:
+                edges.append(heapq.heappop(events)[1])
+            edges = N.array(edges, dtype=N.int64)
+            self._pending[edges] = False
+            self._time = step
+
+            # The edges may have become inactive since they were scheduled
+
+            hit = edges[self._active(edges)]
+            self._transmit(self._sources[hit], self._csr.indices[hit])
+            self._schedule(edges)
+        self._time = max(self._time, int(time))
+
+    def get_time(self):
+        return self._time
+
+    # ####################
+    # Private Methodes
+    # ####################
+
+    def _set_topology(self, G, nodes=None):
+        super(GillespieDiffusion, self)._set_topology(G, nodes)
+        self._sources = N.repeat(N.arange(len(self._csr)),
+                                 self._csr.degree)
+        self._reverse = self._csr.reverse_edges()
+
+    def _active(self, edges):
+        (src, dst) = (self._sources[edges], self._csr.indices[edges])
+        return (self._states[src] == 1) \
+            & (self._strategies[src] == COOPERATOR) \
+            & ((self._states[dst] == 0) | (self._time_stamps[dst]
+               != self._time_stamps[src])) & (self._csr.weights[edges] > 0)
+
+    def _schedule(self, edges):
+        '''
+        Push the step of the next transmission of the given edges that are
+        active and not already in the queue
+        '''
+
+        edges = N.unique(edges)
+        edges = edges[self._active(edges) & ~self._pending[edges]]
+        steps = self._time + self._random.geometric(N.minimum(
+                self._csr.weights[edges], 1.0))
+        self._pending[edges] = True
+        for (step, edge) in zip(steps.tolist(), edges.tolist()):
+            heapq.heappush(self._events, (step, edge))
+
+    def _schedule_all(self):
+        self._pending = N.zeros(len(self._csr.indices), dtype=bool)
+        self._events = []
+        self._frontier = N.zeros(0, dtype=N.int64)
+        self._schedule(N.arange(len(self._csr.indices)))
+
+    def _add_to_frontier(self, changed):
+        '''
+        Schedule the edges from and toward the nodes whose state or time
+        stamp changed
+        '''
+
+        if self._frontier is None:
+            return
+        edges = self._csr.out_edges(N.unique(N.asarray(changed,
+                                    dtype=N.int64)))[1]
+        self._schedule(N.concatenate([edges, self._reverse[edges]]))
+
+
+def reachability(graphs, nb_step=1, sources=None, strategies=None,
+                 seed=None):
+    '''
+    Run the diffusion of Diffusion.diffusion_step from every source at once,
+    and return which nodes every source reaches and at which step.
+
+    The infections of 64 sources are packed in every uint64 word of a node,
+    bit s of word w standing for the source 64*w+s. At every step an edge
+    is live with the probability of its weight, the same draw being used
+    by all the sources, and a live edge from a cooperator ORs its words
+    into the ones of its neighbor.
+
+    :Example:
+    >>> import networkx as nx
+    >>> (reach, first_step) = reachability(nx.path_graph(4), nb_step=2)
+    >>> first_step[0]
+    array([ 0,  1,  2, -1])
+
+    :Parameters:
+    - `graphs` : networkx.Graph or sequence of networkx.Graph
+        graph, or slices (e.g. a DyGraph) with the same nodes, played in
+        order, the columns follow the nodes of the first graph
+    - `nb_step` : int (default 1)
+        number of steps played on every graph
+    - `sources` : list (default every node)
+        source nodes, one row of the results per source
+    - `strategies` : dict (default every node is a cooperator)
+        strategy 'C' or 'D' of every node, only the cooperators transmit
+    - `seed` : int (default None)
+        seed of the random draws
+
+    :Returns:
+    - (reach, first_step) : (numpy.ndarray, numpy.ndarray)
+        boolean matrix sources x nodes of the infected nodes, and matrix of
+        the step at which every node got infected (-1 if never)
+    '''
+
+    random_state = N.random.RandomState(seed)
+    if isinstance(graphs, nx.Graph):
+        graphs = [graphs]
+    nodes = None
+    for G in graphs:
+        csr = CSRGraph(G, nodes, weight='weight')
+        if nodes is None:
+            nodes = csr.nodes
+            nb_node = len(nodes)
+            if sources is None:
+                sources = nodes
+            nb_source = len(sources)
+            if strategies is None:
+                cooperator = N.ones(nb_node, dtype=bool)
+            else:
+                cooperator = N.array([strategies[node] == 'C' for node in
+                                     nodes])
+
+            # Every source infects itself at step 0
+
+            bits = N.arange(64, dtype=N.uint64)
+            reach = N.zeros((nb_node, (nb_source + 63) // 64),
+                            dtype=N.uint64)
+            row = N.array([csr.index[node] for node in sources],
+                          dtype=N.int64)
+            column = N.arange(nb_source)
+            N.bitwise_or.at(reach, (row, column // 64),
+                            N.uint64(1) << bits[column % 64])
+            first_step = -N.ones((nb_source, nb_node), dtype=N.int64)
+            first_step[column, row] = 0
+            step = 0
+        sources_of_edges = N.repeat(N.arange(nb_node), csr.degree)
+        transmit = cooperator[sources_of_edges]
+        for i in xrange(int(nb_step)):
+            step += 1
+            live = transmit & (random_state.random_sample(len(csr.indices))
+                               < csr.weights)
+            infected = reach.copy()
+            N.bitwise_or.at(infected, csr.indices[live],
+                            reach[sources_of_edges[live]])
+
+            # Unpack the new bits of the nodes that got infected
+
+            new = infected & ~reach
+            (node, word) = N.nonzero(new)
+            (k, bit) = N.nonzero((new[node, word][:, None] >> bits)
+                                 & N.uint64(1))
+            first_step[word[k] * 64 + bit, node[k]] = step
+            reach = infected
+
+    reach = (reach[:, :, None] >> bits) & N.uint64(1)
+    reach = reach.reshape(nb_node, -1)[:, :nb_source].T.astype(bool)
+    return (reach, first_step)
@@ -195,44 +195,98 @@ class DyGraph:
             number of node in the model 
         '''
 
-        from mobility.levy_walk import levy_walk
+        from mobility.levy_walk import levy_walks
         import networkx as nx
 
-        # For each node generate a levy_walk
+        # Generate the levy walks of all the nodes at once
+
+        positions = levy_walks(
+            nb_node=nb_node,
+            alpha=alpha,
+            beta=beta,
+            sample_length=self._time_step,
+            size_max=size_max,
+            velocity=velocity,
+            f_min=f_min,
+            f_max=f_max,
+            s_min=s_min,
+            s_max=s_max,
+            duration=self._time_stop,
+            b_c=b_c,
+            )
+
+        # Foreach time step add the nodes with pos=(X,Y) in the graph
+
+        for i in range(positions.shape[1]):
+            self._slices[int(i * self._time_step)]['graph'
+                        ].add_nodes_from((node, {'pos': tuple(pos)})
+                    for (node, pos) in enumerate(positions[:, i]))
 
-        for node in range(nb_node):
-            (un_sampled, A, B, sampled) = levy_walk(
-                alpha=alpha,
-                beta=beta,
-                sample_length=self._time_step,
-                size_max=size_max,
-                velocity=velocity,
-                f_min=f_min,
-                f_max=f_max,
-                s_min=s_min,
-                s_max=s_max,
-                duration=self._time_stop,
-                b_c=b_c,
-                )
+        # For each slice generate a the edges of the graph
 
-            # Position X,Y at time T of a node in his walk
+        for (key, val) in self._slices.iteritems():
+            pos = nx.get_node_attributes(val['graph'], 'pos')
+            G = self._generate_gemetric_graph(nb_node, pos=pos,
+                    radius=radius)
+            nx.set_node_attributes(G, 'pos', pos)
+            self.add_graph(G, key)
 
-            (X, Y, T) = zip(*sampled)
+    def iter_mobility_levy_walk(
+        self,
+        alpha,
+        beta,
+        size_max,
+        f_min,
+        f_max,
+        s_min,
+        s_max,
+        b_c,
+        radius,
+        velocity=1.0,
+        nb_node=1,
+        ):
+        '''
+        Generate the slices of generate_mobility_levy_walk online: the Levy
+        walks are drawn lazily and the graph of every slice is yielded
+        instead of being stored, so the memory does not depend on the
+        number of slices
 
-            # Foreach time step add a new node with pos=(X,Y) in the graph
+        :Example:
+        >>> G = DyGraph(time_stop=2000.0, time_step=5.0)
+        >>> for g in G.iter_mobility_levy_walk(alpha=0.9, beta=0.9, size_max=1000, f_min=10, f_max=1000, s_min=5, s_max=1000.0, b_c=2, radius=200.0, nb_node=400):
+        ...     print g.graph['slice_time']
 
-            for i in range(len(T)):
-                self._slices[int(T[i])]['graph'].add_node(node,
-                        pos=(X[i], Y[i]))
+        :Parameters:
+        - see generate_mobility_levy_walk
+        '''
 
-        # For each slice generate a the edges of the graph
+        from mobility.levy_walk import iter_levy_walks
+        from itertools import izip
+        import networkx as nx
 
-        for (key, val) in self._slices.iteritems():
-            pos = nx.get_node_attributes(val['graph'], 'pos')
+        walks = iter_levy_walks(
+            nb_node=nb_node,
+            alpha=alpha,
+            beta=beta,
+            sample_length=self._time_step,
+            size_max=size_max,
+            velocity=velocity,
+            f_min=f_min,
+            f_max=f_max,
+            s_min=s_min,
+            s_max=s_max,
+            duration=self._time_stop,
+            b_c=b_c,
+            )
+        for (slice_time, (t, positions)) in izip(self._slice_time,
+                walks):
+            pos = dict((node, tuple(p)) for (node, p) in
+                       enumerate(positions))
             G = self._generate_gemetric_graph(nb_node, pos=pos,
                     radius=radius)
             nx.set_node_attributes(G, 'pos', pos)
-            self.add_graph(G, key)
+            G.graph['slice_time'] = slice_time
+            yield G
 
     def generate_weights(
         self,
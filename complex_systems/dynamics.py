@@ -0,0 +1,288 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# -------------------------------------------------------------------------------
+# Copyright (c) 2012 Vincent Gauthier.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+# -------------------------------------------------------------------------------
+
+__author__ = """\n""".join(['Vincent Gauthier'])
+
+__all__ = ['COOPERATOR', 'DEFECTOR', 'STRATEGY_LABELS', 'fermi_update',
+           'CounterSeries', 'EarlyStop', 'PayoffNoise']
+
+import numpy as N
+
+# Strategy encoding of the array backed games
+
+COOPERATOR = 1
+DEFECTOR = 0
+STRATEGY_LABELS = ('D', 'C')
+
+
+def fermi_update(
+    csr,
+    strategies,
+    payoffs,
+    temperature,
+    out,
+    random_state=None,
+    ):
+    '''
+    Synchronous Fermi imitation step shared by the games.
+
+    Every node :math:`x` with at least one neighbor draws a neighbor :math:`y`
+    uniformly at random and adopts its strategy with probability
+
+    .. math::
+        p = \\frac{1}{1 + e^{(P_x - P_y)/K}}
+
+    where :math:`P` are the payoffs and :math:`K` the temperature.
+
+    :Parameters:
+    - `csr` : CSRGraph
+        topology of the game
+    - `strategies` : numpy.array(int8)
+        strategies of the current slot, either a vector of length N or a
+        (R x N) matrix holding R independent replicas
+    - `payoffs` : numpy.array(float)
+        payoffs of the current slot, same shape as `strategies`
+    - `temperature` : float
+        noise of the imitation, K > 0
+    - `out` : numpy.array(int8)
+        buffer receiving the strategies of the next slot, must not be
+        `strategies` itself
+    - `random_state` : numpy.random.RandomState (default numpy.random)
+        generator of the random draws
+
+    :Returns:
+    - `delta` : numpy.array(int)
+        change of the number of cooperators of every replica, computed from
+        the nodes that imitated a neighbor only
+    '''
+
+    from scipy.special import expit
+
+    if random_state is None:
+        random_state = N.random
+    nb_node = len(csr)
+    out[...] = strategies
+    strategies = strategies.reshape(-1, nb_node)
+    if len(csr.indices) == 0:
+        return N.zeros(strategies.shape[0], dtype=N.int64)
+
+    payoffs = payoffs.reshape(-1, nb_node)
+    out = out.reshape(-1, nb_node)
+    rows = N.arange(strategies.shape[0])[:, N.newaxis]
+    have_neighbor = csr.degree > 0
+
+    # One random neighbor per node and per replica, picked in the CSR row
+    # of the node
+
+    pick = csr.offsets[:-1] + (random_state.random_sample(strategies.shape)
+                               * csr.degree).astype(N.int32)
+    comp_nb = csr.indices[N.minimum(pick, len(csr.indices) - 1)]
+
+    proba = expit((payoffs[rows, comp_nb] - payoffs) / temperature)
+    adopt = have_neighbor & (random_state.random_sample(strategies.shape)
+                             < proba)
+    (adopt_row, adopt_node) = N.nonzero(adopt)
+    adopted = strategies[adopt_row, comp_nb[adopt_row, adopt_node]]
+    out[adopt_row, adopt_node] = adopted
+    flip = adopted.astype(N.int64) - strategies[adopt_row, adopt_node]
+    return N.bincount(adopt_row, weights=flip,
+                      minlength=strategies.shape[0]).astype(N.int64)
+
+
+class CounterSeries:
+
+    '''
+    Preallocated ring buffer holding the last `maxlen` values of a per step
+    counter, one column per row of state.
+
+    :Example:
+    >>> series = CounterSeries(maxlen=3, nb_row=1)
+    >>> for i in range(5):
+    ...     series.append([i])
+    >>> series.values()[:, 0]
+    array([2, 3, 4])
+    '''
+
+    def __init__(self, maxlen, nb_row=1):
+        self._buffer = N.zeros((int(maxlen), nb_row), dtype=N.int64)
+        self._position = 0
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def append(self, values):
+        self._buffer[self._position] = values
+        self._position = (self._position + 1) % len(self._buffer)
+        self._length = min(self._length + 1, len(self._buffer))
+
+    def is_full(self):
+        return self._length == len(self._buffer)
+
+    def fill(self, values, nb_step):
+        '''
+        Append the same values nb_step times
+        '''
+
+        for i in xrange(min(int(nb_step), len(self._buffer))):
+            self.append(values)
+
+    def clear(self):
+        self._position = 0
+        self._length = 0
+
+    def mean(self):
+        '''
+        Mean of the stored values of every row
+        '''
+
+        return self.values().mean(axis=0)
+
+    def values(self):
+        '''
+        Stored values in chronological order, with shape (len x nb_row)
+        '''
+
+        if self._length < len(self._buffer):
+            return self._buffer[:self._length].copy()
+        return N.roll(self._buffer, -self._position, axis=0)
+
+
+class PayoffNoise:
+
+    '''
+    Gaussian payoff noise of the games, drawn from the generator of the
+    simulation by blocks of steps: one vector of shape `shape` is handed out
+    per step, and the generator is only called once every `block` steps.
+
+    The noise of every node at every step follows N(0, scale), as the former
+    per dealer numpy.random.normal(loc=0.0, scale=noise_var) draws.
+
+    :Parameters:
+    - `scale` : float
+        standard deviation of the noise
+    - `shape` : tuple
+        shape of the noise of one step
+    - `random_state` : numpy.random.RandomState
+        generator of the simulation
+    - `max_block_size` : int (default 2**20)
+        upper bound on the number of values drawn at once
+    '''
+
+    def __init__(
+        self,
+        scale,
+        shape,
+        random_state,
+        max_block_size=2 ** 20,
+        ):
+        self._scale = scale
+        self._shape = tuple(shape)
+        self._random_state = random_state
+        self._block = max(1, min(64, max_block_size
+                          // max(1, int(N.prod(self._shape)))))
+        self._buffer = None
+        self._position = self._block
+
+    def next(self):
+        '''
+        Return the noise of the next step
+        '''
+
+        if self._position == self._block:
+            self._buffer = self._random_state.normal(loc=0.0,
+                    scale=self._scale, size=(self._block, ) + self._shape)
+            self._position = 0
+        self._position += 1
+        return self._buffer[self._position - 1]
+
+
+class EarlyStop:
+
+    '''
+    Opt-in early termination policy of the ``run_game`` methods.
+
+    A run stops as soon as every row of state is fixated at all-C or all-D
+    (the imitation dynamics can not leave these states), and, when a
+    tolerance is given, as soon as the cooperation fraction is stationary:
+    the mean and the variance of the two halves of the full counter window
+    differ by less than the tolerance for every row.
+
+    After a run, the game reports why and when it stopped through its
+    ``get_stop_reason`` method.
+
+    :Parameters:
+    - `absorbing` : bool (default True)
+        stop at an absorbing state
+    - `tolerance` : float (default None)
+        stop when the windowed mean and variance of the cooperation fraction
+        change less than tolerance, disabled when None
+    '''
+
+    ABSORBING = 'absorbing'
+    STATIONARY = 'stationary'
+
+    def __init__(self, absorbing=True, tolerance=None):
+        self.absorbing = absorbing
+        self.tolerance = tolerance
+
+    def stop_reason(
+        self,
+        nb_coop,
+        nb_cooperator,
+        nb_node,
+        idle=True,
+        ):
+        '''
+        Return the reason to stop the run or None to keep going
+
+        :Parameters:
+        - `nb_coop` : CounterSeries
+            number of cooperators over the last steps
+        - `nb_cooperator` : int or numpy.array(int)
+            current number of cooperators of every row
+        - `nb_node` : int
+            number of nodes
+        - `idle` : bool (default True)
+            False when another process still evolves the state of the game
+            even at fixation (e.g. a packet diffusion)
+        '''
+
+        nb_cooperator = N.asarray(nb_cooperator)
+        if self.absorbing and idle and N.all((nb_cooperator == 0)
+                | (nb_cooperator == nb_node)):
+            return self.ABSORBING
+
+        if self.tolerance is not None and nb_coop.is_full():
+            values = nb_coop.values() / float(nb_node)
+            half = len(values) // 2
+            (first, second) = (values[:half], values[-half:])
+            if half > 1 and N.all(N.abs(first.mean(axis=0)
+                                  - second.mean(axis=0)) < self.tolerance) \
+                and N.all(N.abs(first.var(axis=0) - second.var(axis=0))
+                          < self.tolerance):
+                return self.STATIONARY
+        return None
@@ -26,7 +26,15 @@
 
 __author__ = """\n""".join(['Vincent Gauthier <vgauthier@luxbulb.org>'])
 
-__all__ = ['levy_walk']
+__all__ = ['levy_walk', 'levy_walks', 'levy_waypoints', 'resample',
+           'iter_levy_walks']
+
+import numpy as N
+
+# Scale parameters of the flight length and of the pause time distributions
+
+FLIGHT_SCALE = 10.0
+PAUSE_SCALE = 1.0
 
 
 def levy_walk(
@@ -110,197 +118,375 @@ def levy_walk(
             list of sampled intervals
     '''
 
-    import stabrnd as R
-    import numpy as N
+    _check_exponents(alpha, beta)
+    num_step = int(N.ceil(float(duration) / sample_length))
+    (waypoints, times, A, B) = _flights(1, alpha, beta, size_max, velocity,
+            f_min, f_max, s_min, s_max, duration)
 
-    # Pause Time scale parameter
+    # Location at the end of every flight and of every pause
 
-    pt_scale = 1.0
+    (X, Y) = N.round(_fold(waypoints[0], size_max, b_c)).T
+    T = times[0]
 
-    # Flight Length scale parameter
+    # Location at the sample times
 
-    fl_scale = 10.0
+    T_sampled = N.arange(num_step) * float(sample_length)
+    (X_sampled, Y_sampled) = N.round(resample(waypoints, times, T_sampled,
+            size_max, b_c)[0]).T
+    un_sampled = zip(X, Y, T)
+    sampled = zip(X_sampled, Y_sampled, T_sampled)
+    return (un_sampled, A[0], B[0], sampled)
 
-    # DEBUG
 
-    DEBUG = False
+def levy_walks(
+    nb_node,
+    alpha,
+    beta,
+    sample_length,
+    size_max,
+    velocity,
+    f_min,
+    f_max,
+    s_min,
+    s_max,
+    duration=90000,
+    b_c=1,
+    ):
+    '''
+    Levy walks of nb_node walkers at once, see levy_walk for the model.
 
-    delta = 0.0
+    The flights of all the walkers are drawn as (nodes x flights) arrays:
+    the walk is first built in the unfolded plane with cumulative sums of
+    the flights, then sampled by linear interpolation and finally folded
+    back in the simulation area (modulo for the wrap-around, triangle wave
+    for the reflection, which also handles the flights crossing the area
+    several times).
 
-    # Velocity in meter per mins
+    :Example:
+    >>> from complex_systems.mobility.levy_walk import *
+    >>> positions = levy_walks(nb_node=100, alpha=0.66, beta=0.99, sample_length=1, size_max=83000, velocity=1.0, f_min=8, f_max=83000, s_min=0.8, s_max=430, duration=500, b_c=2)
+    >>> positions.shape
+    (100, 500, 2)
 
-    velocity = velocity
-    if DEBUG:
-        print 'velocity (m/mins): ', velocity
+    :Parameters:
+    - `nb_node` : int
+        number of walkers
+    - the other parameters are the ones of levy_walk
+
+    :Returns:
+    - `positions` : numpy.ndarray
+        (nb_node x num_step x 2) X, Y location of the walkers at the sample
+        times arange(num_step) * sample_length, with
+        num_step = ceil(duration / sample_length)
+    '''
 
     num_step = int(N.ceil(float(duration) / sample_length))
-    num_step_gen = 10*int(N.ceil(float(duration) / s_min))
+    (waypoints, times) = levy_waypoints(nb_node, alpha, beta, size_max,
+            velocity, f_min, f_max, s_min, s_max, duration)
+    return N.round(resample(waypoints, times, N.arange(num_step)
+                   * float(sample_length), size_max, b_c))
+
+
+def levy_waypoints(
+    nb_node,
+    alpha,
+    beta,
+    size_max,
+    velocity,
+    f_min,
+    f_max,
+    s_min,
+    s_max,
+    duration=90000,
+    ):
+    '''
+    Draw the flights and pauses of nb_node walkers until every walk lasts
+    more than duration, see levy_walk for the parameters. The walks can then
+    be sampled at any time with resample.
+
+    :Returns:
+    - `waypoints` : numpy.ndarray
+        (nb_node x 2K+1 x 2) location of the walkers in the unfolded plane
+        at their start, then at the end of every flight and of every pause
+    - `times` : numpy.ndarray
+        (nb_node x 2K+1) time of every waypoint
+    '''
 
-    if DEBUG:
-        print 'num steps: ', num_step
+    _check_exponents(alpha, beta)
+    return _flights(nb_node, alpha, beta, size_max, velocity, f_min, f_max,
+                    s_min, s_max, duration)[:2]
 
-    # Constant speed
 
-    mu = 0.0
+def resample(
+    waypoints,
+    times,
+    sample_times,
+    size_max=None,
+    b_c=1,
+    ):
+    '''
+    Location of the walkers at the given sample times, linearly interpolated
+    between the unfolded waypoints and then folded back in the simulation
+    area
 
-    # Bounds of the simulation area
+    :Example:
+    >>> (waypoints, times) = levy_waypoints(nb_node=10, alpha=0.66, beta=0.99, size_max=1000, velocity=1.0, f_min=8, f_max=1000, s_min=0.8, s_max=430, duration=500)
+    >>> for sample_length in (1.0, 5.0, 10.0):
+    ...     positions = resample(waypoints, times, N.arange(0, 500, sample_length), 1000, 2)
 
-    max_x = size_max
-    max_y = size_max
+    :Parameters:
+    - `waypoints` : numpy.ndarray
+        (nb_node x W x 2) unfolded waypoints, as given by levy_waypoints
+    - `times` : numpy.ndarray
+        (nb_node x W) non decreasing time of every waypoint
+    - `sample_times` : numpy.ndarray
+        times at which the walkers are located, the location is held
+        outside of [times[:, 0], times[:, -1]]
+    - `size_max` : int (default None)
+        size of simulation area, the locations are not folded if None
+    - `b_c` : int
+        boundary condition:
+            - wrap-around if b_c=1
+            - reflection boundary if b_c=2
 
-    A = []
-    B = []
-    x = [0] * (num_step_gen + 1)
-    y = [0] * (num_step_gen + 1)
-    t = [0] * (num_step_gen + 1)
-    x_sampled = [0] * (num_step_gen)
-    y_sampled = [0] * (num_step_gen)
-    t_sampled = [0] * (num_step_gen)
-    dist = [0] * num_step_gen
+    :Returns:
+    - `positions` : numpy.ndarray
+        (nb_node x len(sample_times) x 2) location of the walkers
+    '''
 
-    if alpha < .1 or alpha > 2:
-        raise ValueError('Alpha must be in [.1,2] for function stabrnd.'
-                         )
+    positions = _interpolate(N.asarray(waypoints, dtype=N.float64),
+                             N.asarray(times, dtype=N.float64),
+                             N.asarray(sample_times, dtype=N.float64))
+    if size_max is None:
+        return positions
+    return _fold(positions, size_max, b_c)
 
+
+def iter_levy_walks(
+    nb_node,
+    alpha,
+    beta,
+    sample_length,
+    size_max,
+    velocity,
+    f_min,
+    f_max,
+    s_min,
+    s_max,
+    duration=None,
+    b_c=1,
+    chunk_size=64,
+    ):
+    '''
+    Levy walks of nb_node walkers, see levy_walks, generated lazily: the
+    location of the walkers is yielded at every sample time while the
+    flights are drawn by chunks of chunk_size flights per walker, so the
+    memory does not depend on the duration.
+
+    Every walker has a cursor on the segment (flight or pause) of its
+    chunk in progress, and only the walkers at the end of their chunk draw
+    a new one.
+
+    :Example:
+    >>> for (t, positions) in iter_levy_walks(nb_node=100, alpha=0.66, beta=0.99, sample_length=1, size_max=83000, velocity=1.0, f_min=8, f_max=83000, s_min=0.8, s_max=430, duration=500, b_c=2):
+    ...     pass
+
+    :Parameters:
+    - `duration` : int (default None)
+        simulation duration, endless walks if None
+    - `chunk_size` : int (default 64)
+        number of flights drawn at once for a walker
+    - the other parameters are the ones of levy_walks
+
+    :Returns:
+    - iterator of (t, positions) with positions the (nb_node x 2) X, Y
+      location of the walkers at the sample time t
+    '''
+
+    _check_exponents(alpha, beta)
+    row = N.arange(nb_node)
+
+    # Start of the segment in progress, in the unfolded plane
+
+    position = size_max * N.random.rand(nb_node, 2)
+    start_time = N.zeros(nb_node)
+    samplers = _samplers(alpha, beta)
+    (steps, durations) = _flight_chunk(nb_node, samplers, velocity, f_min,
+            f_max, s_min, s_max, chunk_size)[:2]
+    cursor = N.zeros(nb_node, dtype=int)
+
+    j = 0
+    while duration is None or j * sample_length < duration:
+        t = j * float(sample_length)
+
+        # Move the walkers whose segment ends before t to their next segment
+
+        done = start_time + durations[row, cursor] < t
+        while done.any():
+            position[done] += steps[done, cursor[done]]
+            start_time[done] += durations[done, cursor[done]]
+            cursor[done] += 1
+            refill = cursor == durations.shape[1]
+            if refill.any():
+                (steps[refill], durations[refill]) = _flight_chunk(
+                        int(refill.sum()), samplers, velocity, f_min,
+                        f_max, s_min, s_max, chunk_size)[:2]
+                cursor[refill] = 0
+            done = start_time + durations[row, cursor] < t
+
+        # The folding has a period of 2*size_max, which keeps the unfolded
+        # location bounded
+
+        position = N.mod(position, 2 * size_max)
+        ratio = N.clip((t - start_time) / N.maximum(durations[row, cursor],
+                       1e-12), 0.0, 1.0)
+        yield (t, N.round(_fold(position + ratio[:, None] * steps[row,
+               cursor], size_max, b_c)))
+        j += 1
+
+
+# ####################
+# Private Functions
+# ####################
+
+def _check_exponents(alpha, beta):
+    if alpha < .1 or alpha > 2:
+        raise ValueError('Alpha must be in [.1,2] for function stabrnd.')
     if beta < .1 or beta > 2:
         raise ValueError('Beta must be in [.1,2] for function stabrnd.')
 
-    # Generate flight length
-
-    while len(A) < num_step_gen:
-        A_temp = N.abs(R.stabrnd(
-            alpha,
-            0,
-            fl_scale,
-            delta,
-            num_step,
-            1,
-            ))
-        A_temp = A_temp[A_temp > f_min]
-        A_temp = A_temp[A_temp < f_max]
-        A = N.append(A, A_temp)
-
-    A = N.round(A[0:num_step_gen])
-
-    # Generate pause time
-
-    while len(B) < num_step_gen:
-        B_temp = N.abs(R.stabrnd(
-            beta,
-            0,
-            pt_scale,
-            0,
-            num_step,
-            1,
-            ))
-        B_temp = B_temp[B_temp > s_min]
-        B_temp = B_temp[B_temp < s_max]
-        B = N.append(B, B_temp)
-
-    B = N.round(B[0:num_step_gen])
-
-    # Initial Step
-
-    x[0] = max_x * N.random.rand()
-    y[0] = max_y * N.random.rand()
-    if DEBUG:
-        print x[0], y[0]
-    t[0] = 0
-    x_sampled[0] = x[0]
-    y_sampled[0] = y[0]
-    j = 1
-
-    for i in N.arange(1, num_step_gen, 2):
-        theta = 2 * N.pi * N.random.rand()
-        next_x = N.round(x[i - 1] + A[i] * N.cos(theta))
-        next_y = N.round(y[i - 1] + A[i] * N.sin(theta))
-        if b_c == 1:
-            # Boundary of the simulation Area
-            # Wrap around
-            if next_x < 0:
-                x[i] = max_x + next_x
-            elif next_x > max_x:
-                x[i] = next_x - max_x
-            else:
-                x[i] = next_x
-
-            if next_y < 0:
-                y[i] = max_y + next_y
-            elif next_y > max_y:
-                y[i] = next_y - max_y
-            else:
-                y[i] = next_y
-        elif b_c == 2:
-            # Boundary of the simulation Area
-            # Reflection
-            if next_x < 0:
-                x[i] = -next_x
-            elif next_x > max_x:
-                x[i] = max_x - (next_x - max_x)
-            else:
-                x[i] = next_x
-
-            if next_y < 0:
-                y[i] = -next_y
-            elif next_y > max_y:
-                y[i] = max_y - (next_y - max_y)
-            else:
-                y[i] = next_y
-            # end of boundary
-
-        dist[i] = N.sqrt(float((next_x - x[i - 1]) ** 2 + (next_y - y[i
-                         - 1]) ** 2))
-        t[i] = t[i - 1] + N.power(float(dist[i]) / velocity, 1 - mu)
-        t[i + 1] = t[i] + N.abs(B[i])
-        x[i + 1] = x[i]
-        y[i + 1] = y[i]
-
-        while (j * sample_length) < t[i + 1]:
-
-            if j * sample_length < t[i]:
-                p_ratio = ((j * sample_length)- t[i-1]) / (t[i] - t[i - 1])
-                x_sampled[j] = next_x * p_ratio + x[i - 1] * (1 - p_ratio)
-                y_sampled[j] = next_y * p_ratio + y[i - 1] * (1 - p_ratio)
-                t_sampled[j] = j * sample_length
-                if b_c == 1:
-                    # Boundary wrap around
-                    if x_sampled[j] < 0:    
-                        x_sampled[j] = max_x + x_sampled[j]
-                    elif x_sampled[j] > max_x:
-                        x_sampled[j] = next_x - max_x
-                    if y_sampled[j] < 0:
-                        y_sampled[j] = max_y + y_sampled[j]
-                    elif y_sampled[j] > max_y:
-                        y_sampled[j] = next_y - max_y
-                elif b_c == 2:
-                    # Boundary Reflection
-                    if x_sampled[j] < 0:
-                        x_sampled[j] = -x_sampled[j]
-                    elif x_sampled[j] > max_x:
-                        x_sampled[j] = max_x - (x_sampled[j] - max_x)
-                    if y_sampled[j] < 0:
-                        y_sampled[j] = -y_sampled[j]
-                    elif y_sampled[j] > max_y:
-                        y_sampled[j] = max_y - (y_sampled[j] - max_y)
-            else:
-                x_sampled[j] = x[i]
-                y_sampled[j] = y[i]
-                t_sampled[j] = j * sample_length
-            
-            j += 1
-
-        if t[i+1] > duration:
-            break
-
-    if DEBUG:
-        print 'Simulation length : ', len(x)
-
-    X = N.round(x[0:i])
-    Y = N.round(y[0:i])
-    T = t[0:i]
-    X_sampled = N.round(x_sampled[0:num_step])
-    Y_sampled = N.round(y_sampled[0:num_step])
-    T_sampled = t_sampled[0:num_step]
-    un_sampled = zip(X,Y,T)
-    sampled = zip(X_sampled, Y_sampled, T_sampled)
-    return (un_sampled, A, B, sampled)
+
+def _samplers(alpha, beta):
+    '''
+    Stable samplers of the flight lengths and of the pause times of a walk,
+    seeded from numpy.random so that numpy.random.seed still reproduces the
+    walks
+    '''
+
+    from complex_systems.mobility.stabrnd import StableSampler
+    return (StableSampler(alpha, 0, FLIGHT_SCALE, 0,
+            seed=N.random.randint(2 ** 31)), StableSampler(beta, 0,
+            PAUSE_SCALE, 0, seed=N.random.randint(2 ** 31)))
+
+
+def _truncated_stable(sampler, low, high, shape):
+    '''
+    Draw |X| with X symmetric stable drawn by sampler, truncated to
+    ]low, high[ and rounded
+    '''
+
+    from complex_systems.mobility.stabrnd import truncated_stabrnd
+    (alpha, beta, c, delta) = sampler.get_parameters()
+    return N.round(truncated_stabrnd(alpha, beta, c, delta, low, high,
+                   shape, absolute=True, sampler=sampler))
+
+
+def _flights(
+    nb_node,
+    alpha,
+    beta,
+    size_max,
+    velocity,
+    f_min,
+    f_max,
+    s_min,
+    s_max,
+    duration,
+    ):
+    '''
+    Draw the flights and pauses of nb_node walkers until every walk lasts
+    more than duration
+
+    Return the unfolded waypoints (nodes x 2K+1 x 2), their times
+    (nodes x 2K+1), the flight lengths and the pause times (nodes x K):
+    waypoint 2i+1 is the end of flight i and waypoint 2i+2 the end of the
+    pause that follows.
+    '''
+
+    start = size_max * N.random.rand(nb_node, 1, 2)
+    samplers = _samplers(alpha, beta)
+    chunks = []
+    (nb_flight, walk_time) = (16, N.zeros(nb_node))
+    while len(chunks) == 0 or walk_time.min() <= duration:
+        chunks.append(_flight_chunk(nb_node, samplers, velocity, f_min,
+                      f_max, s_min, s_max, nb_flight))
+        walk_time += chunks[-1][1].sum(axis=1)
+        nb_flight *= 2
+    (steps, durations, lengths, pauses) = [N.concatenate(values, axis=1)
+            for values in zip(*chunks)]
+
+    waypoints = N.concatenate([start, start + N.cumsum(steps, axis=1)],
+                              axis=1)
+    times = N.concatenate([N.zeros((nb_node, 1)), N.cumsum(durations,
+                          axis=1)], axis=1)
+    return (waypoints, times, lengths, pauses)
+
+
+def _flight_chunk(
+    nb_node,
+    samplers,
+    velocity,
+    f_min,
+    f_max,
+    s_min,
+    s_max,
+    nb_flight,
+    ):
+    '''
+    Draw nb_flight flights, each one followed by its pause, for nb_node
+    walkers, with the (flight, pause) samplers of _samplers
+
+    Return the steps (nodes x 2K x 2) and the durations (nodes x 2K) of the
+    flights and of the pauses, which do not move, interleaved, then the
+    flight lengths and the pause times (nodes x K).
+    '''
+
+    length = _truncated_stable(samplers[0], f_min, f_max, (nb_node,
+                               nb_flight))
+    pause = _truncated_stable(samplers[1], s_min, s_max, (nb_node,
+                              nb_flight))
+    theta = 2 * N.pi * N.random.rand(nb_node, nb_flight)
+    step = N.round(length[:, :, None] * N.dstack([N.cos(theta),
+                   N.sin(theta)]))
+    flight_time = N.sqrt((step ** 2).sum(axis=2)) / velocity
+    steps = N.zeros((nb_node, 2 * nb_flight, 2))
+    steps[:, ::2] = step
+    durations = N.dstack([flight_time, pause]).reshape(nb_node, -1)
+    return (steps, durations, length, pause)
+
+
+def _interpolate(waypoints, times, sample_times):
+    '''
+    Linearly interpolate the waypoints (nodes x W x 2) given at times
+    (nodes x W, non decreasing rows) at the sample times, with a single
+    searchsorted on the rows laid end to end
+    '''
+
+    (nb_node, nb_waypoint) = times.shape
+    span = max(times.max(), sample_times.max()) + 1.0
+    offset = span * N.arange(nb_node)[:, None]
+    index = N.searchsorted((times + offset).ravel(), (sample_times[None, :]
+                           + offset).ravel(), side='right') - 1
+    index = index.reshape(nb_node, -1) - N.arange(nb_node)[:, None] \
+        * nb_waypoint
+    index = N.clip(index, 0, nb_waypoint - 2)
+    row = N.arange(nb_node)[:, None]
+    (t0, t1) = (times[row, index], times[row, index + 1])
+    with N.errstate(divide='ignore', invalid='ignore'):
+        ratio = N.where(t1 > t0, (sample_times - t0) / (t1 - t0), 0.0)
+    ratio = N.clip(ratio, 0.0, 1.0)[:, :, None]
+    (p0, p1) = (waypoints[row, index], waypoints[row, index + 1])
+    return p0 + ratio * (p1 - p0)
+
+
+def _fold(positions, size_max, b_c):
+    '''
+    Fold unfolded positions back in [0, size_max], wrap-around if b_c=1 and
+    reflection if b_c=2
+    '''
+
+    if b_c == 1:
+        return N.mod(positions, size_max)
+    elif b_c == 2:
+        return size_max - N.abs(N.mod(positions, 2 * size_max) - size_max)
+    raise ValueError('b_c must be 1 (wrap-around) or 2 (reflection).')
@@ -23,7 +23,9 @@
 
 __author__ = """\n""".join(['Vincent Gauthier <vgauthier@luxbulb.org>'])
 
-__all__ = ['stabrnd']
+__all__ = ['stabrnd', 'truncated_stabrnd', 'StableSampler']
+
+import numpy as N
 
 
 def stabrnd(alpha, beta, c, delta, m, n):
@@ -191,3 +193,342 @@ def stabrnd(alpha, beta, c, delta, m, n):
     # Finale
     x = delta + c * x
     return x
+
+
+def truncated_stabrnd(alpha, beta, c, delta, low, high, size,
+                      absolute=False, max_batch=2**20, sampler=None):
+    '''
+    Stable random numbers of stabrnd truncated to the open interval
+    ]low, high[, drawn by rejection.
+
+    The acceptance rate is estimated on a first batch, and the next batches
+    are oversampled accordingly to fill a preallocated output, usually in
+    one or two rounds.
+
+    :Example:
+    >>> x = truncated_stabrnd(0.66, 0, 10.0, 0, 8, 83000, 1000, absolute=True)
+    >>> bool(N.all((x > 8) & (x < 83000)))
+    True
+
+    :Parameters:
+    - `alpha, beta, c, delta` : float
+        parameters of the stable distribution, see stabrnd
+    - `low, high` : float
+        bounds of the truncation, low < high
+    - `size` : int or tuple
+        shape of the result
+    - `absolute` : bool (default False)
+        truncate and return the absolute values |x|
+    - `max_batch` : int (default 2**20)
+        maximum number of values drawn at once, a ValueError is raised when
+        none of the first max_batch values falls in ]low, high[
+    - `sampler` : StableSampler (default None)
+        sampler bound to (alpha, beta, c, delta) drawing the batches,
+        stabrnd and the numpy.random generator if None
+
+    :Returns:
+    - `x` : numpy.ndarray
+    '''
+
+    if alpha < .1 or alpha > 2:
+        raise ValueError('Alpha must be in [.1,2] for function stabrnd.')
+    if N.abs(beta) > 1:
+        raise ValueError('Beta must be in [-1,1] for function stabrnd.')
+    if not low < high or (absolute and high <= 0):
+        raise ValueError('The truncation interval ]low, high[ is empty.')
+
+    out = N.empty(size, dtype=N.float64)
+    values = out.reshape(-1)
+    (nb_filled, nb_drawn, nb_accepted) = (0, 0, 0)
+    while nb_filled < len(values):
+        nb_missing = len(values) - nb_filled
+
+        # Oversample by the inverse of the acceptance rate estimated so far
+        # (at least one value in the first batch, a quarter more to make a
+        # second round unlikely)
+
+        if nb_drawn == 0:
+            nb_batch = nb_missing
+        else:
+            rate = max(nb_accepted, 1) / float(nb_drawn)
+            nb_batch = int(1.25 * nb_missing / rate) + 16
+        nb_batch = min(nb_batch, max_batch)
+        if sampler is None:
+            x = stabrnd(alpha, beta, c, delta, nb_batch, 1).ravel()
+        else:
+            x = sampler.sample(nb_batch)
+        if absolute:
+            x = N.abs(x)
+        x = x[(x > low) & (x < high)]
+        (nb_drawn, nb_accepted) = (nb_drawn + nb_batch, nb_accepted
+                                   + len(x))
+        if nb_accepted == 0 and nb_drawn >= max_batch:
+            raise ValueError('No value drawn in the truncation interval ]low, high[ out of %d draws.' % nb_drawn)
+        x = x[:nb_missing]
+        values[nb_filled:nb_filled + len(x)] = x
+        nb_filled += len(x)
+    return out
+
+
+class StableSampler:
+
+    '''
+    Stable random number generator of stabrnd bound to the parameters
+    (alpha, beta, c, delta), with the constants of the CMS method computed
+    once and its own random generator.
+
+    In the symmetric case (beta = 0) the sampler can use a lookup table of
+    the inverse cdf instead: the table is the sorted sample of table_size
+    draws and a uniform u is mapped onto the interpolated u-quantile of
+    this sample. By the Dvoretzky-Kiefer-Wolfowitz inequality the cdf of
+    the table is within table_error() of the exact one. The draws with u in
+    the tails (below tail or above 1-tail), where the quantiles are sparse,
+    are exact draws conditioned on falling beyond the tail quantile of the
+    table on the side picked by u.
+
+    The tail draws use the CMS representation x = S(phi) (C(phi) / w) **
+    ((1 - alpha) / alpha): for a given phi, x is monotone in the exponential
+    w, so the tail is an interval of w. phi is drawn by rejection under a
+    piecewise constant envelope of the tail probability, then w from its
+    exponential law restricted to that interval.
+
+    :Example:
+    >>> sampler = StableSampler(0.66, 0, 10.0, 0, seed=1)
+    >>> x = sampler.sample(1000)
+    >>> buffer = N.empty((100, 10))
+    >>> x = sampler.sample(out=buffer)
+    >>> fast = StableSampler(0.66, 0, 10.0, 0, seed=1, table_size=2**18)
+    >>> x = fast.sample(1000)
+
+    :Parameters:
+    - `alpha, beta, c, delta` : float
+        parameters of the stable distribution, see stabrnd
+    - `seed` : int (default None)
+        seed of the random generator
+    - `table_size` : int (default None)
+        size of the inverse cdf lookup table, exact draws only if None
+    - `tail` : float (default 1e-3)
+        probability of each tail drawn exactly in the lookup table mode
+    '''
+
+    def __init__(self, alpha, beta, c, delta, seed=None, table_size=None,
+                 tail=1e-3):
+        if alpha < .1 or alpha > 2:
+            raise ValueError('Alpha must be in [.1,2] for function stabrnd.')
+        if N.abs(beta) > 1:
+            raise ValueError('Beta must be in [-1,1] for function stabrnd.')
+        if c <= 0:
+            raise ValueError('The scale c must be positive.')
+        self._alpha = float(alpha)
+        self._beta = float(beta)
+        self._c = float(c)
+        self._delta = float(delta)
+        self._random = N.random.RandomState(seed)
+
+        # Constants of the CMS method
+
+        alpha = self._alpha
+        self._inv_alpha = 1.0 / alpha
+        self._exponent = 1.0 / alpha - 1.0
+        self._general_exponent = (1.0 - alpha) / alpha
+        self._zeta = self._beta * N.tan(N.pi * alpha / 2)
+        if alpha != 1:
+            self._shift = self._zeta
+        else:
+            self._shift = 0.0
+
+        self._table = None
+        self._tail = float(tail)
+        if table_size is not None:
+            if self._beta != 0:
+                raise ValueError('The lookup table is only available in the symmetric case beta = 0.')
+            if table_size < 2:
+                raise ValueError('The lookup table needs at least two values.')
+            if not 0 < self._tail < 0.5:
+                raise ValueError('The tail probability must be in ]0, 0.5[.')
+            self._table = N.sort(self._draw(int(table_size)))
+
+            # Tails beyond the table quantiles of tail and 1-tail, the lower
+            # one is drawn as the opposite of an upper one
+
+            threshold = N.interp([self._tail, 1 - self._tail],
+                                 N.linspace(0, 1, len(self._table)),
+                                 self._table) * [-1, 1]
+            if not N.all(threshold > 0):
+                raise ValueError('The lookup table is too small for the tail probability.')
+            self._tails = [self._tail_envelope(t) for t in threshold]
+
+    def sample(self, size=None, out=None):
+        '''
+        Return stable random numbers of the given shape, written in out when
+        it is given
+
+        :Parameters:
+        - `size` : int or tuple
+            shape of the result, ignored when out is given
+        - `out` : numpy.ndarray (default None)
+            contiguous float64 buffer receiving the result
+        '''
+
+        if out is None:
+            out = N.empty(size, dtype=N.float64)
+        elif not out.flags.c_contiguous or out.dtype != N.float64:
+            raise ValueError('out must be a C contiguous float64 array.')
+        x = out.reshape(-1)
+        if self._table is None:
+            x[:] = self._draw(len(x))
+        else:
+            u = self._random.random_sample(len(x))
+            position = u * (len(self._table) - 1)
+            index = N.minimum(position.astype(N.int64), len(self._table)
+                              - 2)
+            fraction = position - index
+            x[:] = self._table[index]
+            x += fraction * (self._table[index + 1] - self._table[index])
+            lower = u < self._tail
+            upper = u > 1 - self._tail
+            x[lower] = -self._draw_tail(int(N.count_nonzero(lower)),
+                                        self._tails[0])
+            x[upper] = self._draw_tail(int(N.count_nonzero(upper)),
+                                       self._tails[1])
+        x *= self._c
+        x += self._delta
+        return out
+
+    def get_parameters(self):
+        '''
+        Return the parameters (alpha, beta, c, delta) of the distribution
+        '''
+
+        return (self._alpha, self._beta, self._c, self._delta)
+
+    def table_error(self, confidence=0.99):
+        '''
+        Return the bound on the distance between the cdf of the lookup table
+        and the exact cdf holding with the given confidence
+        (Dvoretzky-Kiefer-Wolfowitz inequality), None without table
+        '''
+
+        if self._table is None:
+            return None
+        return N.sqrt(N.log(2.0 / (1.0 - confidence)) / (2.0
+                      * len(self._table)))
+
+    # ####################
+    # Private Methodes
+    # ####################
+
+    def _draw(self, n):
+        '''
+        Draw n standard (c = 1, delta = 0) stable random numbers with the CMS
+        method, see stabrnd
+        '''
+
+        w = -N.log(self._random.random_sample(n))
+        phi = (self._random.random_sample(n) - 0.5) * N.pi
+        alpha = self._alpha
+        if alpha == 2:
+            return 2 * N.sqrt(w) * N.sin(phi)
+        if self._beta == 0:
+            if alpha == 1:
+                return N.tan(phi)
+            return (N.cos((1 - alpha) * phi) / w) ** self._exponent \
+                * N.sin(alpha * phi) / N.cos(phi) ** self._inv_alpha
+        cosphi = N.cos(phi)
+        if N.abs(alpha - 1) > 1.e-8:
+            aphi = alpha * phi
+            a1phi = (1 - alpha) * phi
+            return (N.sin(aphi) + self._zeta * N.cos(aphi)) / cosphi \
+                * ((N.cos(a1phi) + self._zeta * N.sin(a1phi)) / (w
+                   * cosphi)) ** self._general_exponent
+        bphi = N.pi / 2 + self._beta * phi
+        return 2 / N.pi * (bphi * N.tan(phi) - self._beta * N.log(N.pi / 2
+                           * w * cosphi / bphi)) + self._shift
+
+    def _tail_envelope(self, threshold):
+        '''
+        Envelope of the probability g(phi) that a standard draw with the
+        given phi in ]0, pi/2[ exceeds threshold > 0
+
+        The cells are geometric in d = pi/2 - phi, where the tail mass
+        concentrates, and the envelope on a cell bounds g with the extreme
+        values of the cos and sin terms on the cell.
+        '''
+
+        alpha = self._alpha
+        d = N.pi / 2 * 0.9 ** N.arange(400.0)
+        (d_high, d_low) = (d, N.append(d[1:], 0.0))
+        if alpha == 1:
+            g = (d_low < N.arctan(1 / threshold)).astype(N.float64)
+        else:
+            (phi_low, phi_high) = (N.pi / 2 - d_high, N.pi / 2 - d_low)
+            sin_max = N.maximum(N.sin(alpha * phi_low), N.sin(alpha
+                                * phi_high))
+            sin_max[(alpha * phi_low <= N.pi / 2) & (alpha * phi_high
+                    >= N.pi / 2)] = 1.0
+            with N.errstate(divide='ignore', over='ignore'):
+                s_max = sin_max / N.sin(d_low) ** self._inv_alpha
+                exponent = alpha / (1 - alpha)
+                if alpha < 1:
+                    w = N.cos((1 - alpha) * phi_low) * (s_max / threshold) \
+                        ** exponent
+                    g = -N.expm1(-w)
+                else:
+                    w = N.cos((alpha - 1) * phi_high) * (s_max
+                            / threshold) ** exponent
+                    g = N.exp(-w)
+        weight = N.cumsum(g * (d_high - d_low))
+        return (float(threshold), d_low, d_high, g, weight)
+
+    def _draw_tail(self, n, envelope):
+        '''
+        Draw n standard stable random numbers conditioned on x > threshold,
+        see _tail_envelope
+        '''
+
+        (threshold, d_low, d_high, g_max, weight) = envelope
+        alpha = self._alpha
+        out = N.empty(n)
+        (nb_filled, rate) = (0, 0.5)
+        while nb_filled < n:
+            nb_batch = int(1.25 * (n - nb_filled) / rate) + 16
+            k = N.searchsorted(weight, weight[-1]
+                               * self._random.random_sample(nb_batch))
+            k = N.minimum(k, len(weight) - 1)
+            d = d_low[k] + self._random.random_sample(nb_batch) \
+                * (d_high[k] - d_low[k])
+            (d, k) = (d[d > 0], k[d > 0])
+            if alpha == 1:
+
+                # Cauchy case, x = tan(phi) = 1 / tan(d)
+
+                x = 1 / N.tan(d)
+                x = x[x > threshold]
+            else:
+                phi = N.pi / 2 - d
+                s = N.sin(alpha * phi) / N.sin(d) ** self._inv_alpha
+                cos = N.cos((1 - alpha) * phi)
+                with N.errstate(divide='ignore', over='ignore'):
+                    w = cos * (s / threshold) ** (alpha / (1 - alpha))
+                    if alpha < 1:
+                        g = -N.expm1(-w)
+                    else:
+                        g = N.exp(-w)
+                keep = self._random.random_sample(len(d)) * g_max[k] < g
+                (s, cos, w, g) = (s[keep], cos[keep], w[keep], g[keep])
+
+                # The exponential w restricted to ]0, w[ if alpha < 1 and to
+                # ]w, inf[ if alpha > 1
+
+                v = self._random.random_sample(len(w))
+                if alpha < 1:
+                    w = -N.log1p(-v * g)
+                else:
+                    w = w - N.log1p(-v)
+                x = s * (cos / w) ** self._general_exponent
+                x = x[x > threshold]
+            rate = max(len(x), 1) / float(nb_batch)
+            x = x[:n - nb_filled]
+            out[nb_filled:nb_filled + len(x)] = x
+            nb_filled += len(x)
+        return out
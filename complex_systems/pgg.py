@@ -26,9 +26,56 @@
 
 __author__ = """\n""".join(['Abhik Banerjee', 'Vincent Gauthier'])
 
+import numpy as N
+from complex_systems.csr_graph import CSRGraph
+from complex_systems.dynamics import COOPERATOR, STRATEGY_LABELS, \
+    CounterSeries, EarlyStop, PayoffNoise, fermi_update
+
 
 class PublicGoodGames:
 
+    '''
+    Public Good Game played on the neighborhood of every node of a graph.
+
+    The graph is frozen into a CSR adjacency when the game is created, the
+    strategies are stored as int8 (1 for 'C', 0 for 'D') and the payoffs as
+    float64, both indexed by the position of the node in ``CSRGraph.nodes``.
+
+    With ``nb_replica=R`` the game runs in ensemble mode: R independent
+    replicas share the topology and their strategies and payoffs are held
+    as (R x N) matrices, so that every step advances all the replicas with
+    one sparse-dense matrix product. In this mode the counters and
+    ``run_game`` return one value per replica.
+
+    When ``synergy`` is a sequence of S values, one state per synergy value
+    (times nb_replica) evolves side by side on the same topology and
+    ``run_game`` returns the cooperation curve over the synergy values, with
+    shape (S, ) or (S, R) in ensemble mode.
+
+    ``payoff`` selects the payoff kernel: 'local' (default), where every node
+    only collects the payoff of the group centred on itself, or 'santos',
+    where every node collects its share of the k+1 groups it belongs to
+    (F. C. Santos, M. D. Santos and J. M. Pacheco, Nature 454, 2008).
+
+    ``early_stop`` takes an optional EarlyStop policy that ends ``run_game``
+    before nb_simulation_step at an absorbing or stationary state.
+
+    ``update`` selects the strategy update: 'synchronous' (default), where
+    every node imitates at once from the payoffs of the previous slot, or
+    'asynchronous' (random sequential), where one step is made of N
+    elementary updates of randomly chosen nodes that see the flips of the
+    previous ones. In the asynchronous mode the payoffs are recomputed
+    lazily: a flip only marks the payoffs that depend on the flipping node
+    as dirty (its closed neighborhood for the local kernel, the 2-hop
+    neighborhood for the santos kernel), so that the cost of an elementary
+    update is proportional to the local degree rather than to N. The
+    payoff noise is drawn afresh at every comparison.
+
+    All the random draws of a game come from its own generator, seeded with
+    ``seed``, so that the games run by a multiprocessing pool are
+    independent.
+    '''
+
     def __init__(
         self,
         G,
@@ -37,139 +84,223 @@ class PublicGoodGames:
         cooperator_ratio=0.0,
         noise_var=0.0, 
         maxlen_queue=200, 
+        temperature=0.1,
+        nb_replica=1,
+        early_stop=None,
+        payoff='local',
+        seed=None,
+        update='synchronous',
         ):
 
-        import random as rd
-        import collections
+        if payoff not in ('local', 'santos'):
+            raise ValueError("payoff must be either 'local' or 'santos'.")
+        if update not in ('synchronous', 'asynchronous'):
+            raise ValueError("update must be either 'synchronous' or 'asynchronous'.")
+        self._asynchronous = update == 'asynchronous'
+        self._payoff_kernel = payoff
+        self._random = N.random.RandomState(seed)
         self._noise_var = noise_var
-        self._G = G
+        self._set_topology(G)
+        self._nb_node = len(self._csr)
         self._synergy = synergy
+        self._temperature = temperature
         self._nb_simulation_step = int(nb_simulation_step)
-        self._nb_coop = collections.deque(maxlen=maxlen_queue)
-        self._nb_def = collections.deque(maxlen=maxlen_queue)
+        self._early_stop = early_stop
+        self._stop_reason = (None, 0)
 
-        for nd in self._G.nodes_iter():
+        # One row of state per (synergy, replica) pair, the ensemble shape
+        # is the shape of the per row results (a scalar when neither the
+        # synergy nor the replicas are batched)
 
-            # Initialize payoff and fitness values of nodes
+        self._nb_replica = int(nb_replica)
+        synergy_range = N.atleast_1d(N.asarray(synergy, dtype=N.float64))
+        self._ensemble_shape = ()
+        if N.ndim(synergy) == 1:
+            self._ensemble_shape += (len(synergy_range), )
+        if self._nb_replica != 1:
+            self._ensemble_shape += (self._nb_replica, )
+        self._row_synergy = N.repeat(synergy_range, self._nb_replica)
+        self._nb_row = len(self._row_synergy)
+        if self._asynchronous and self._nb_row != 1:
+            raise ValueError('The asynchronous update does not support the synergy range nor the replicas.')
 
-            self.reset_payoffs()
+        # Number of cooperators stored at every step over the last
+        # maxlen_queue steps
 
-            # Assign initial strategy
+        self._nb_coop = CounterSeries(maxlen_queue, self._nb_row)
 
-            if rd.random() < cooperator_ratio:
-                self._G.node[nd]['strategy'] = 'C'
-            else:
-                self._G.node[nd]['strategy'] = 'D'
+        # Initialize payoff and fitness values of nodes
+
+        self._payoffs = N.zeros((self._nb_row, self._nb_node),
+                                dtype=N.float64)
+        self._noise = PayoffNoise(self._noise_var, self._payoffs.shape,
+                                  self._random)
+
+        # Assign initial strategy. The update is synchronous, so the strategies
+        # are double buffered: updateStrategy writes the next slot in
+        # _next_strategies and then swaps the two buffers.
+
+        self._strategies = (self._random.random_sample((self._nb_row,
+                            self._nb_node))
+                            < cooperator_ratio).astype(N.int8)
+        self._next_strategies = N.empty_like(self._strategies)
+
+        # Running number of cooperators of every row, updated by the strategy
+        # update with the nodes that flipped only
+
+        self._nb_cooperator = self._strategies.sum(axis=1, dtype=N.int64)
 
     def compute_payoffs_santos(self, dealer):
         '''
         Compute the payoffs 
         '''
 
-        #Kx = self.cooperator_in_neighborhood_counter(dealer)
-        Kx = self._G.degree(dealer)
+        dealer = self._csr.index[dealer]
 
-        dealer_neighborhood = self._G.neighbors(dealer)
-        dealer_neighborhood.append(dealer)
-        
-        cost_i = 0
-        for i in dealer_neighborhood:
-            if self._G.node[i]['strategy'] == 'C':
-                Ki =self._G.degree(i)
-                cost_i += 1.0 / (Ki + 1)
-
-        for y in dealer_neighborhood:
-            cost_y = 0
-            if self._G.node[y]['strategy'] == 'C' :
-                Ky = self._G.degree(y)
-                cost_y = 1.0 / (Ky + 1)
-            self._G.node[y]['payoff'] += (self._synergy/(Kx+1)) * cost_i - cost_y
+        dealer_neighborhood = N.append(self._csr.neighbors(dealer), dealer)
+        cost = self._strategies[:, dealer_neighborhood] \
+            * self._inv_group_size[dealer_neighborhood]
+        cost_i = cost.sum(axis=1)[:, N.newaxis]
+        self._payoffs[:, dealer_neighborhood] += \
+            self._row_synergy[:, N.newaxis] \
+            * self._inv_group_size[dealer] * cost_i - cost
 
     def compute_payoffs(self, dealer):
         '''
         Compute the payoffs 
         '''
-        import numpy as np
 
-        dealer_neighborhood = self._G.neighbors(dealer)
-        dealer_neighborhood.append(dealer)
+        dealer = self._csr.index[dealer]
+        dealer_neighborhood = N.append(self._csr.neighbors(dealer), dealer)
         if self._noise_var > 0:
-            noise = np.random.normal(loc=0.0, scale=self._noise_var, size=1)
+            noise = self._random.normal(loc=0.0, scale=self._noise_var,
+                                        size=self._nb_row)
         else:
             noise = 0.0
-        
-        if self._G.node[dealer]['strategy'] == 'C':
-            cost_y = 1.0
-        else:
-            cost_y = 0
 
-        cost_i = 0
-        for i in dealer_neighborhood:
-            if self._G.node[i]['strategy'] == 'C' :
-                Ki = self._G.degree(i)
-                cost_i += 1.0 / (Ki + 1)
-        self._G.node[dealer]['payoff'] = self._synergy * cost_i - cost_y + noise
+        cost_y = self._strategies[:, dealer]
+        cost_i = N.dot(self._strategies[:, dealer_neighborhood],
+                       self._inv_group_size[dealer_neighborhood])
+        self._payoffs[:, dealer] = self._row_synergy * cost_i - cost_y \
+            + noise
+
+    def compute_all_payoffs(self):
+        '''
+        Compute the payoffs of every dealer at once with the selected kernel
+
+        .. math::
+            payoff_{local} = synergy \\cdot (A+I) \\cdot \\frac{c}{k+1} - c + noise
+
+        .. math::
+            payoff_{santos} = synergy \\cdot (A+I) \\cdot \\left( \\frac{1}{k+1}
+            (A+I) \\cdot \\frac{c}{k+1} \\right) - c + noise
+
+        where :math:`c` is the cooperator indicator vector and :math:`k` the
+        degree vector. In ensemble mode :math:`c` is the (R x N) strategy
+        matrix and the product is computed for all the replicas at once.
+        For the santos kernel the second product scatters the share of every
+        group back onto its k+1 members, each cooperator paying 1/(k+1) in
+        each of its k+1 groups, hence the cost c.
+        '''
+
+        contribution = (self._strategies * self._inv_group_size).T
+        pool = self._row_synergy * self._group.dot(contribution)
+        if self._payoff_kernel == 'santos':
+            pool = self._group.dot(pool * self._inv_group_size[:,
+                                   N.newaxis])
+        self._payoffs[:] = pool.T - self._strategies
+        if self._noise_var > 0:
+            self._payoffs += self._noise.next()
 
     def run_game(self, nb_simulation_step=None):
+        '''
+        Play nb_simulation_step rounds of the game and return the average
+        fraction of cooperators over the last maxlen_queue rounds (one
+        fraction per synergy value and per replica in the batched modes)
+        '''
+
         if nb_simulation_step != None:
             nb_step = int(nb_simulation_step)
         else:
             nb_step = self._nb_simulation_step
+        self._stop_reason = (None, nb_step)
+        if self._asynchronous:
+            self._reset_asynchronous_payoffs()
         for i in xrange(int(nb_step)):
-            for dealer in self._G.nodes_iter():
-                self.compute_payoffs(dealer)
-            # Update the simuations variable
-            self.store_cooperator_defector_counter()
-            self.updateStrategy()
-            self.reset_payoffs()
-
-        nb_coop = sum(self._nb_coop)/len(self._nb_coop)
-        return (float(nb_coop)/len(self._G.nodes()))
+            if self._asynchronous:
+                self.store_cooperator_defector_counter()
+                self._asynchronous_step()
+            else:
+                self.compute_all_payoffs()
+                # Update the simuations variable
+                self.store_cooperator_defector_counter()
+                self.updateStrategy()
+                self.reset_payoffs()
+
+            if self._early_stop is not None:
+                reason = self._early_stop.stop_reason(self._nb_coop,
+                        self._nb_cooperator, self._nb_node)
+                if reason is not None:
+                    if reason == EarlyStop.ABSORBING:
+                        # The remaining steps would all store the same counter
+                        self._nb_coop.fill(self._nb_cooperator,
+                                           nb_step - i - 1)
+                    self._stop_reason = (reason, i + 1)
+                    break
+
+        return self._ensemble_result(self._nb_coop.mean() / self._nb_node)
 
 
     def updateStrategy(self):
-        import random as rd
-        import numpy as np
 
-        # We create a copy of the graph so that the transitions in the same time slot
-        # do not impact each other.
-        # Since nodes update their strategies based on payoffs in the previous slot
+        # Nodes update their strategies based on payoffs in the previous slot,
+        # so the new strategies are written in the back buffer in order for
+        # the transitions in the same time slot not to impact each other.
 
-        H = self._G.copy()
+        self._nb_cooperator += fermi_update(self._csr, self._strategies,
+                self._payoffs, self._temperature, self._next_strategies,
+                self._random)
+        (self._strategies, self._next_strategies) = \
+            (self._next_strategies, self._strategies)
 
-        # Update strategies. In this version, the adaptation of PGG is limited
-        # to the payoffs only, as done above. The strategy update takes place
-        # irrespective of whether a node has new packets or not.
-
-        for nd in self._G.nodes_iter():
-
-            # Choose a random neighbor and change strategy with probability
-            # proportional to the difference
-
-            nd_deg = self._G.degree(nd)
-            nd_nblist = self._G.neighbors(nd)
-
-            if nd_deg != 0:
-                comp_nb = nd_nblist[int(np.floor(rd.random() * nd_deg))]
-                pyoff_diff = self._G.node[nd]['payoff'] \
-                    - self._G.node[comp_nb]['payoff']
-                if rd.random() < 1 / (1 + np.exp(pyoff_diff / 0.1)):
-                    H.node[nd]['strategy'] = \
-                        self._G.node[comp_nb]['strategy']
+    def rebind(self, G):
+        '''
+        Play the next games on the graph G, e.g. the next slice of a DyGraph,
+        keeping the strategies and the payoffs of the nodes. The cooperator
+        counter window is cleared, so run_game averages over the new slice
+        only, as a new game would.
+
+        :Parameters:
+        - `G` : networkx.Graph
+            new topology, with the same nodes as the current graph
+        '''
 
-        self._G = H.copy()
+        self._set_topology(G, self._csr.nodes)
+        self._nb_coop.clear()
 
     #
     # Set
     #
 
-    def set_payoffs(self, payoffs):
-        for node in self._G.nodes_iter():
-            self._G.node[node]['payoff'] = payoffs[node]
+    def set_payoffs(self, payoffs, replica=None):
+        '''
+        Set the payoffs from a dict node -> payoff, for every row of state
+        or only for the given row
+        '''
 
-    def set_strategies(self, strategies):
-        for node in self._G.nodes_iter():
-            self._G.node[node]['strategy'] = strategies[node]
+        self._payoffs[self._rows(replica)] = [payoffs[node] for node in
+                self._csr.nodes]
+
+    def set_strategies(self, strategies, replica=None):
+        '''
+        Set the strategies from a dict node -> 'C' or 'D', for every row of
+        state or only for the given row
+        '''
+
+        self._strategies[self._rows(replica)] = [strategies[node] == 'C'
+                for node in self._csr.nodes]
+        self._nb_cooperator[:] = self._strategies.sum(axis=1,
+                dtype=N.int64)
 
     def set_node_have_packet_to_send(self, packet_to_send):
         for node in self._G.nodes_iter():
@@ -179,69 +310,205 @@ class PublicGoodGames:
     # Get
     #
 
-    def get_strategies(self):
-        strategies = {}
-        for node in self._G.nodes_iter():
-            strategies[node] = self._G.node[node]['strategy']
-        return strategies
+    def get_strategies(self, replica=0):
+        return dict(zip(self._csr.nodes, [STRATEGY_LABELS[s] for s in
+                    self._strategies[replica]]))
 
-    def get_payoffs(self):
-        payoffs = {}
-        for node in self._G.nodes_iter():
-            payoffs[node] = self._G.node[node]['payoff']
-        return payoffs
+    def get_payoffs(self, replica=0):
+        return dict(zip(self._csr.nodes, self._payoffs[replica].tolist()))
+
+    def get_stop_reason(self):
+        '''
+        Return (reason, nb_step) for the last call of run_game, where reason
+        is None when all the steps were played, or EarlyStop.ABSORBING or
+        EarlyStop.STATIONARY, and nb_step the number of steps played
+        '''
+
+        return self._stop_reason
+
+    def get_cooperator_series(self):
+        '''
+        Return the number of cooperators at every step stored over the last
+        maxlen_queue steps, as an array of shape (nb_step, ) + ensemble shape
+        '''
+
+        values = self._nb_coop.values()
+        return values.reshape((len(values), ) + self._ensemble_shape)
+
+    def get_defector_series(self):
+        '''
+        Return the number of defectors at every step stored over the last
+        maxlen_queue steps, as an array of shape (nb_step, ) + ensemble shape
+        '''
+
+        return self._nb_node - self.get_cooperator_series()
+
+    def get_synergy(self):
+        '''
+        Return the synergy of every row of state with the ensemble shape
+        '''
+
+        return self._ensemble_result(self._row_synergy)
 
     #
     # Reset
     #
 
     def reset_payoffs(self):
-        for nd in self._G.nodes_iter():
-            self._G.node[nd]['payoff'] = 0.0
+        self._payoffs.fill(0.0)
 
     def reset_payoffs_selected_player(self, player):
-        self._G.node[player]['payoff'] = 0.0
+        self._payoffs[:, self._csr.index[player]] = 0.0
 
     #
     # Counter
     #
 
     def compute_avg_payoffs(self):
-        avg_pay_c = 0
-        avg_pay_d = 0
-        avg_pay = 0
-        for node in self._G.nodes_iter():
-            avg_pay += self._G.node[node]['payoff']
-            if self._G.node[node]['strategy'] == 'C':
-                avg_pay_c += self._G.node[node]['payoff']
-            else:
-                avg_pay_d += self._G.node[node]['payoff']
-        nbcoop = self.cooperator_counter()
-        if nbcoop != 0:
-            avg_pay_c = avg_pay_c / nbcoop
-        else:
-            avg_pay_c = 0
-        nbdef = self.defector_counter()
-        if nbdef != 0:
-            avg_pay_d = avg_pay_d / self.defector_counter()
-        else:
-            avg_pay_d = 0
-        avg_pay = avg_pay / len(self._G.nodes())
-        return (avg_pay_c, avg_pay_d, avg_pay)
+        cooperators = self._strategies == COOPERATOR
+        nbcoop = self._nb_cooperator
+        nbdef = self._nb_node - nbcoop
+        avg_pay_c = N.where(nbcoop != 0, (self._payoffs
+                            * cooperators).sum(axis=1)
+                            / N.maximum(nbcoop, 1), 0)
+        avg_pay_d = N.where(nbdef != 0, (self._payoffs
+                            * ~cooperators).sum(axis=1)
+                            / N.maximum(nbdef, 1), 0)
+        avg_pay = self._payoffs.sum(axis=1) / self._nb_node
+        return (self._ensemble_result(avg_pay_c),
+                self._ensemble_result(avg_pay_d),
+                self._ensemble_result(avg_pay))
 
     def cooperator_counter(self):
-        return [self._G.node[i]['strategy'] for i in
-                self._G.nodes_iter()].count('C')
+        return self._ensemble_result(self._nb_cooperator)
     
     def store_cooperator_defector_counter(self):
-        self._nb_coop.append(self.cooperator_counter())
-        self._nb_def.append(self.defector_counter())
+        self._nb_coop.append(self._nb_cooperator)
 
     def defector_counter(self):
-        return [self._G.node[i]['strategy'] for i in
-                self._G.nodes_iter()].count('D')
+        return self._nb_node - self.cooperator_counter()
 
     def cooperator_in_neighborhood_counter(self, node):
-        return [self._G.node[neighbor]['strategy'] for neighbor in
-                self._G.neighbors_iter(node)].count('C')
- 
\ No newline at end of file
+        neighbors = self._csr.neighbors(self._csr.index[node])
+        return self._ensemble_result(self._strategies[:,
+                neighbors].sum(axis=1, dtype=N.int64))
+
+    # ####################
+    # Private Methodes
+    # ####################
+
+    def _set_topology(self, G, nodes=None):
+        self._G = G
+        self._csr = CSRGraph(G, nodes)
+
+        # (A+I) operator and 1/(k+1) vector shared by every payoff step
+
+        self._group = self._csr.adjacency(self_loops=True)
+        self._inv_group_size = 1.0 / (self._csr.degree + 1.0)
+
+    def _reset_asynchronous_payoffs(self):
+        '''
+        Initialize the state of the asynchronous update: the contribution
+        pool of every group, (A+I).(c/(k+1)), kept up to date at every flip,
+        and the dirty flags of the cached noise free payoffs
+        '''
+
+        contribution = self._strategies[0] * self._inv_group_size
+        self._pool = self._group.dot(contribution)
+        self._clean_payoffs = N.zeros(self._nb_node)
+        self._dirty = N.ones(self._nb_node, dtype=bool)
+
+    def _asynchronous_payoff(self, i):
+        '''
+        Noise free payoff of node i, recomputed only when it is dirty
+        '''
+
+        if self._dirty[i]:
+            if self._payoff_kernel == 'santos':
+                group = self._group.indices[self._group.indptr[i]:
+                        self._group.indptr[i + 1]]
+                pool = N.dot(self._inv_group_size[group], self._pool[group])
+            else:
+                pool = self._pool[i]
+            self._clean_payoffs[i] = self._row_synergy[0] * pool \
+                - self._strategies[0, i]
+            self._dirty[i] = False
+        return self._clean_payoffs[i]
+
+    def _asynchronous_flip(self, x):
+        '''
+        Flip the strategy of node x and mark the payoffs depending on it dirty
+        '''
+
+        strategies = self._strategies[0]
+        delta = 1 - 2 * int(strategies[x])
+        strategies[x] += delta
+        self._nb_cooperator[0] += delta
+
+        group = self._group.indices[self._group.indptr[x]:
+                                    self._group.indptr[x + 1]]
+        self._pool[group] += delta * self._inv_group_size[x]
+        if self._payoff_kernel == 'santos':
+            indptr = self._group.indptr
+            self._dirty[N.concatenate([self._group.indices[indptr[g]:
+                        indptr[g + 1]] for g in group])] = True
+        else:
+            self._dirty[group] = True
+
+    def _asynchronous_step(self):
+        '''
+        Random sequential update: N elementary Fermi imitations, the random
+        numbers of the whole step being drawn at once
+        '''
+
+        from math import exp
+
+        nb_node = self._nb_node
+        degree = self._csr.degree
+        offsets = self._csr.offsets
+        indices = self._csr.indices
+        strategies = self._strategies[0]
+
+        players = self._random.randint(0, nb_node, size=nb_node).tolist()
+        picks = self._random.random_sample(nb_node).tolist()
+        accepts = self._random.random_sample(nb_node).tolist()
+        if self._noise_var > 0:
+            noise = self._random.normal(loc=0.0, scale=self._noise_var,
+                    size=nb_node) - self._random.normal(loc=0.0,
+                    scale=self._noise_var, size=nb_node)
+        else:
+            noise = N.zeros(nb_node)
+        noise = noise.tolist()
+
+        for n in xrange(nb_node):
+            x = players[n]
+            if degree[x] == 0:
+                continue
+            y = indices[offsets[x] + int(picks[n] * degree[x])]
+            if strategies[x] == strategies[y]:
+                continue
+            diff = (self._asynchronous_payoff(x)
+                    - self._asynchronous_payoff(y) + noise[n]) \
+                / self._temperature
+            if diff < 700 and accepts[n] < 1 / (1 + exp(diff)):
+                self._asynchronous_flip(x)
+
+    def _rows(self, replica):
+        '''
+        Row selector, a row is indexed by synergy_index * nb_replica + replica
+        '''
+
+        if replica is None:
+            return slice(None)
+        return replica
+
+    def _ensemble_result(self, values):
+        '''
+        Reshape a per row result to the ensemble shape, scalar values are
+        returned as python numbers
+        '''
+
+        values = N.array(values).reshape(self._ensemble_shape)
+        if values.ndim == 0:
+            return values.item()
+        return values
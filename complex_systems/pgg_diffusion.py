@@ -29,10 +29,42 @@ __author__ = """\n""".join(['Abhik Banerjee', 'Vincent Gauthier'])
 import networkx as nx
 import numpy.random as RD
 import numpy as N
+from complex_systems.csr_graph import CSRGraph
+from complex_systems.dynamics import COOPERATOR, STRATEGY_LABELS, \
+    CounterSeries, EarlyStop, PayoffNoise, fermi_update
+
+# Number of bits set in every byte value
+
+_POPCOUNT = N.array([bin(i).count('1') for i in range(256)], dtype=N.uint8)
+
+# Node states of the dissemination, indexed by the value of the state array
+
+_STATE_LABELS = ('S', 'I')
 
 
 class PGG_diffusion:
 
+    '''
+    Public Good Game coupled with the dissemination of buffer_size packets
+    from the seeders.
+
+    The packets held by the nodes are stored as an (N x ceil(buffer_size/8))
+    packed bit matrix: bit p of row i is set when node i holds packet p
+    (packet p is in byte p // 8, most significant bit first, as
+    numpy.packbits). The diffusion works on whole rows with bitwise
+    operations, in place on the node arrays.
+
+    The seeders hold the whole buffer: their rows are set to a shared full
+    bit mask when they are selected, and as rows only ever gain packets
+    the seeders are re-seeded at every step by restoring their strategy
+    and state only.
+
+    The number of packets held by every node, the histogram of these
+    numbers and the number of holders of every packet are updated on
+    delivery, which gives the dissemination progress at every step without
+    scanning the buffers.
+    '''
+
     def __init__(
         self,
         G,
@@ -43,39 +75,68 @@ class PGG_diffusion:
         noise_var=0.0,
         maxlen_queue=200,
         buffer_size = 100,
+        temperature=0.1,
+        early_stop=None,
+        seed=None,
         ):
 
-        import collections
-        import numpy as np 
+        self._random = RD.RandomState(seed)
         self._noise_var = noise_var
-        self._G = G
+        self._set_topology(G)
         self._synergy = synergy
-        self._nb_node = len(G.nodes())
-        self._nb_seeder = nb_seeder
+        self._temperature = temperature
+        self._nb_node = len(self._csr)
+        self._nb_seeder = int(nb_seeder)
         self._nb_simulation_step = int(nb_simulation_step)
-        self._nb_coop = collections.deque(maxlen=maxlen_queue)
-        self._nb_def = collections.deque(maxlen=maxlen_queue)
-        self._infected_node = [RD.randint(0,(self._nb_node-1)) for x in xrange(self._nb_seeder)]
+        self._early_stop = early_stop
+        self._stop_reason = (None, 0)
+        self._nb_coop = CounterSeries(maxlen_queue)
         self._simulation_time = 0
         self._buffer_size = buffer_size
-        self.reset_send_update()
+        self._packets = N.zeros((self._nb_node, (buffer_size + 7) // 8),
+                                dtype=N.uint8)
+        self._full_row = N.packbits(N.arange(self._packets.shape[1] * 8)
+                                    < buffer_size)
+        self._seeders = N.zeros(0, dtype=N.int64)
 
-        for nd in self._G.nodes_iter():
+        # Dissemination progress: packets held per node, histogram of the
+        # packets held, holders per packet, step at which every node holds
+        # a packet (-1 until then) and total packets held per step
 
-            # Initialize payoff and fitness values of nodes
+        self._nb_packets = N.zeros(self._nb_node, dtype=N.int64)
+        self._packet_histogram = N.zeros(buffer_size + 1, dtype=N.int64)
+        self._packet_histogram[0] = self._nb_node
+        self._packet_holders = N.zeros(buffer_size, dtype=N.int64)
+        self._dissemination_time = -N.ones(buffer_size, dtype=N.int64)
+        self._nb_held = 0
+        self._coverage = CounterSeries(maxlen_queue)
+        self._ready_to_sent = N.zeros(self._nb_node, dtype=N.int8)
+        self._infected = N.zeros(self._nb_node, dtype=N.int8)
 
-            self.reset_payoffs()
+        # Visiting order of the diffusion, shuffled in place at every step
+
+        self._order = N.arange(self._nb_node)
+
+        # Initialize payoff and fitness values of nodes
 
-            # Assign initial strategy
-            if RD.random() < cooperator_ratio:
-                self._G.node[nd]['strategy'] = 'C'
-            else:
-                self._G.node[nd]['strategy'] = 'D'
-            self._G.node[nd]['state'] = 'S'
-            self._G.node[nd]['time_stamp'] = []
+        self._payoffs = N.zeros(self._nb_node, dtype=N.float64)
+        self._noise = PayoffNoise(self._noise_var, self._payoffs.shape,
+                                  self._random)
 
-        for infected in self._infected_node:
-            self.set_infected(infected, range(self._buffer_size))
+        # Assign initial strategy, double buffered for the synchronous update
+
+        self._strategies = (self._random.random_sample(self._nb_node)
+                            < cooperator_ratio).astype(N.int8)
+        self._next_strategies = N.empty_like(self._strategies)
+
+        # Running number of cooperators, updated when a strategy flips only
+
+        self._nb_cooperator = int(N.count_nonzero(self._strategies))
+
+        self._select_seeders(self._random.choice(self._nb_node,
+                             min(self._nb_seeder, self._nb_node),
+                             replace=False))
+        self._reseed()
 
 
     def compute_payoffs(self, dealer):
@@ -83,223 +144,276 @@ class PGG_diffusion:
         Compute the payoffs 
         '''
 
-        import numpy as np
-
-        dealer_neighborhood = self._G.neighbors(dealer)
-        dealer_neighborhood.append(dealer)
         if self._noise_var > 0:
-            noise = np.random.normal(loc=0.0, scale=self._noise_var,
-                    size=1)
+            noise = self._random.normal(loc=0.0, scale=self._noise_var)
         else:
             noise = 0.0
+        self._compute_payoff(self._csr.index[dealer], noise)
 
-        if self._G.node[dealer]['strategy'] == 'C' and self._G.node[dealer]['ready_to_sent'] == 1:
-        #if self._G.node[dealer]['strategy'] == 'C':
-            Ni = [self._G.node[nd]['strategy'] for nd in self._G.neighbors(dealer)].count('C')
-            cost_y = 1.0/(Ni+1)
-        else:
-            cost_y = 0
+    def compute_all_payoffs(self):
+        '''
+        Compute the payoffs of every dealer at once, with the noise of the
+        whole step drawn at once
 
-        cost_i = 0
-        for i in dealer_neighborhood:
-            if self._G.node[i]['strategy'] == 'C' and self._G.node[i]['ready_to_sent'] == 1:
-                Nj = [self._G.node[nd]['strategy'] for nd in self._G.neighbors(i)].count('C')
-                cost_i += 1.0 / (Nj+1)
+        The number of cooperating neighbors Nc = A.c is computed once for the
+        step; every sending cooperator pays cost = 1/(Nc+1) and a dealer
+        gets synergy/(Nc+1) times the cost paid in its closed neighborhood.
+        '''
 
-        Nc = [self._G.node[nd]['strategy'] for nd in self._G.neighbors(dealer)].count('C')
-        self._G.node[dealer]['payoff'] = (float(self._synergy)/(Nc+1)) * cost_i - cost_y + noise
+        inv_nb_coop = 1.0 / (self._adjacency.dot(self._strategies) + 1.0)
+        cost = (self._strategies & self._ready_to_sent) * inv_nb_coop
+        self._payoffs[:] = self._synergy * inv_nb_coop \
+            * self._group.dot(cost) - cost
+        if self._noise_var > 0:
+            self._payoffs += self._noise.next()
 
     def diffusion_step(self):
-        from random import choice
-        H = self._G.copy()
-        node_list = H.nodes()
-        RD.shuffle(node_list)
-        for node in node_list:
-            if H.node[node]['state'] == 'I' and H.node[node]['strategy'] == 'C':
-                neighbors = H.neighbors(node)
-                pkt = -1
-                RD.shuffle(neighbors)
-                for neighbor in neighbors:
-                    if pkt == -1:
-                        ready_to_sent = list(set(H.node[node]['time_stamp']) - set(H.node[neighbor]['time_stamp']))
-                        if len(ready_to_sent) > 0:
-                            pkt = choice(ready_to_sent)
-                            H.node[neighbor]['time_stamp'].append(pkt)
-                            H.node[neighbor]['state'] = 'I'
-                            H.node[node]['ready_to_sent'] = 1
-                            for nn in neighbors:
-                                if not (pkt in H.node[nn]['time_stamp']):
-                                    H.node[nn]['time_stamp'].append(pkt)
-                                    H.node[nn]['state'] = 'I'
-                            break
-        self._G = H.copy()
+        '''
+        Let every infected cooperator broadcast one packet that one of its
+        neighbors is missing, and return the number of packets delivered
+
+        The cooperators are visited in random order and see the deliveries
+        of the cooperators visited before them: a node infected earlier in
+        the step already sends. A cooperator picks the first
+        neighbor, in random order, holding less than it, i.e. the first row
+        of packets(node) AND NOT packets(neighbors) that is not empty, draws
+        one packet of that row uniformly and ORs it in the rows of all its
+        neighbors.
+        '''
+
+        delivered = 0
+        packets = self._packets
+        self._random.shuffle(self._order)
+        for sender in self._order:
+            if self._strategies[sender] != COOPERATOR or \
+                not self._infected[sender]:
+                continue
+            neighbors = self._random.permutation(self._csr.neighbors(sender))
+            ready_to_sent = packets[sender] & ~packets[neighbors]
+            have_missing = ready_to_sent.any(axis=1)
+            if not have_missing.any():
+                continue
+            missing = N.flatnonzero(N.unpackbits(
+                    ready_to_sent[N.argmax(have_missing)]))
+            pkt = missing[self._random.randint(len(missing))]
+            (byte, mask) = (pkt >> 3, N.uint8(0x80 >> (pkt & 7)))
+            receivers = neighbors[(packets[neighbors, byte] & mask) == 0]
+            packets[receivers, byte] |= mask
+            self._deliver(receivers, pkt)
+            self._infected[receivers] = 1
+            self._ready_to_sent[sender] = 1
+            delivered += len(receivers)
+        return delivered
 
     def run_game(self, nb_simulation_step=None):
         if nb_simulation_step != None:
             nb_step = int(nb_simulation_step)
         else:
             nb_step = self._nb_simulation_step
+        self._stop_reason = (None, nb_step)
         for i in xrange(int(nb_step)):
-            self.diffusion_step()
-            for dealer in self._G.nodes_iter():
-                self.compute_payoffs(dealer)
+            self._simulation_time += 1
+            delivered = self.diffusion_step()
+            self.compute_all_payoffs()
             self.store_cooperator_defector_counter()
             self.updateStrategy()
             self.reset_payoffs()
 
-            #########
-            # Print Debug 
-            #
-            # NbInfected = 0
-            # NbPacket = 0
-            # nb_update = 0
-            # for nd in self._G.nodes():
-            #     NbPacket += len(self._G.node[nd]['time_stamp'])
-            #     if self._G.node[nd]['ready_to_sent'] == 1:
-            #        nb_update += 1
-            #     if self._G.node[nd]['state'] == 'I':
-            #         NbInfected += 1
-            # finalState = self._nb_node * self._buffer_size
-
-            # print 'NbPacket', 100*float(NbPacket)/finalState , 'Nb Update: ', nb_update, ' NbInfected ', NbInfected
-            #########
-            # End Print Debug 
-            #
-
-
             self.reset_send_update()
-            for infected in self._infected_node:
-                self.set_infected(infected, range(self._buffer_size))
+            self._reseed()
+            self._coverage.append(self._nb_held)
+
+            # The game is only absorbed once the diffusion is idle as well,
+            # after the strategy update and the re-seeding of this step
+
+            if self._early_stop is not None:
+                reason = self._early_stop.stop_reason(self._nb_coop,
+                        self._nb_cooperator, self._nb_node,
+                        idle=delivered == 0 and self._is_diffusion_idle())
+                if reason is not None:
+                    if reason == EarlyStop.ABSORBING:
+                        self._nb_coop.fill(self._nb_cooperator,
+                                           nb_step - i - 1)
+                        self._coverage.fill(self._nb_held, nb_step - i - 1)
+                    self._stop_reason = (reason, i + 1)
+                    break
         
-        nb_coop = sum(self._nb_coop) / len(self._nb_coop)
-        return float(nb_coop) / len(self._G.nodes())
+        return float(self._nb_coop.mean()[0]) / self._nb_node
 
     def updateStrategy(self):
-        import random as rd
-        import numpy as np
-        from random import choice
-        # We create a copy of the graph so that the transitions in the same time slot
-        # do not impact each other.
-        # Since nodes update their strategies based on payoffs in the previous slot
-
-        H = self._G.copy()
 
-        # Update strategies. In this version, the adaptation of PGG is limited
-        # to the payoffs only, as done above. The strategy update takes place
-        # irrespective of whether a node has new packets or not.
+        # Nodes update their strategies based on payoffs in the previous slot,
+        # so the new strategies are written in the back buffer in order for
+        # the transitions in the same time slot not to impact each other.
+        # The adaptation of PGG is limited to the payoffs only, the strategy
+        # update takes place irrespective of whether a node has new packets
+        # or not.
 
-        for nd in self._G.nodes_iter():
+        self._nb_cooperator += int(fermi_update(self._csr, self._strategies,
+                self._payoffs, self._temperature, self._next_strategies,
+                self._random)[0])
+        (self._strategies, self._next_strategies) = \
+            (self._next_strategies, self._strategies)
 
-            # Choose a random neighbor and change strategy with probability
-            # proportional to the difference
-
-            nd_deg = self._G.degree(nd)
-            nd_nblist = self._G.neighbors(nd)
+    def rebind(self, G):
+        '''
+        Play the next games on the graph G, e.g. the next slice of a DyGraph,
+        keeping the strategies, the packets, the states and the seeders of
+        the nodes. The cooperator and coverage windows are cleared, so
+        run_game averages over the new slice only, as a new game would.
+
+        :Parameters:
+        - `G` : networkx.Graph
+            new topology, with the same nodes as the current graph
+        '''
 
-            if nd_deg != 0:
-                comp_nb = choice(nd_nblist)
-                pyoff_diff = self._G.node[nd]['payoff'] \
-                    - self._G.node[comp_nb]['payoff']
-                if rd.random() < 1 / (1 + np.exp(pyoff_diff / 0.1)):
-                    H.node[nd]['strategy'] = \
-                        self._G.node[comp_nb]['strategy']
-        self._G = H.copy()
+        self._set_topology(G, self._csr.nodes)
+        self._nb_coop.clear()
+        self._coverage.clear()
 
     #
     # Set
     #
 
     def set_payoffs(self, payoffs):
-        for node in self._G.nodes_iter():
-            self._G.node[node]['payoff'] = payoffs[node]
+        self._payoffs[:] = [payoffs[node] for node in self._csr.nodes]
 
     def set_strategies(self, strategies):
-        for node in self._G.nodes_iter():
-            self._G.node[node]['strategy'] = strategies[node]
+        self._strategies[:] = [strategies[node] == 'C' for node in
+                               self._csr.nodes]
+        self._nb_cooperator = int(N.count_nonzero(self._strategies))
 
     def set_time_stamps(self, time_stamps):
-        for node in self._G.nodes():
-            self._G.node[node]['time_stamp'] = []
-
+        self._packets.fill(0)
         for (key, val) in time_stamps.iteritems():
-            self._G.node[key]['time_stamp'] = val
+            self._set_packets(self._csr.index[key], val)
+        self._packets[self._seeders] = self._full_row
+        self._count_packets()
 
     def set_seeder(self, seeder):
-        self._infected_node = seeder
+        '''
+        Select the seeders, given as a sequence of nodes; they hold the whole
+        buffer at once and are re-seeded at the end of every step
+        '''
+
+        self._select_seeders([self._csr.index[node] for node in seeder])
 
     def set_nodes_states(self, nodes_states):
         for (key, val) in nodes_states.iteritems():
-            self._G.node[key]['state'] = val
+            self._infected[self._csr.index[key]] = val == 'I'
 
     def set_infected(self, node_id, time_stamp):
-        self._G.node[node_id]['state'] = 'I'
-        self._G.node[node_id]['strategy'] = 'C'
-        self._G.node[node_id]['time_stamp'] = time_stamp
-        self._G.node[node_id]['ready_to_sent'] = 1
+        i = self._csr.index[node_id]
+        self._infected[i] = 1
+        if self._strategies[i] != COOPERATOR:
+            self._strategies[i] = COOPERATOR
+            self._nb_cooperator += 1
+        self._set_packets(i, time_stamp)
+        self._ready_to_sent[i] = 1
 
     def set_sent_update(self, sent_update):
-       for (key, val) in sent_update.iteritems():
-            self._G.node[key]['ready_to_sent'] = val
+        for (key, val) in sent_update.iteritems():
+            self._ready_to_sent[self._csr.index[key]] = val
 
     #
     # Get
     #
 
     def get_strategies(self):
-        strategies = {}
-        for node in self._G.nodes_iter():
-            strategies[node] = self._G.node[node]['strategy']
-        return strategies
+        return dict(zip(self._csr.nodes, [STRATEGY_LABELS[s] for s in
+                    self._strategies]))
 
     def get_payoffs(self):
-        payoffs = {}
-        for node in self._G.nodes_iter():
-            payoffs[node] = self._G.node[node]['payoff']
-        return payoffs
+        return dict(zip(self._csr.nodes, self._payoffs.tolist()))
+
+    def get_stop_reason(self):
+        '''
+        Return (reason, nb_step) for the last call of run_game, see
+        PublicGoodGames.get_stop_reason
+        '''
+
+        return self._stop_reason
+
+    def get_cooperator_series(self):
+        '''
+        Return the number of cooperators at every step stored over the last
+        maxlen_queue steps
+        '''
+
+        return self._nb_coop.values()[:, 0]
+
+    def get_defector_series(self):
+        '''
+        Return the number of defectors at every step stored over the last
+        maxlen_queue steps
+        '''
+
+        return self._nb_node - self.get_cooperator_series()
 
     def get_time_stamps(self):
-        time_stamps = {}
-        for node in self._G.nodes_iter():
-            time_stamps[node] = self._G.node[node]['time_stamp']
-        return time_stamps
+        '''
+        Return the packets held by every node, as sorted lists of packet ids
+        '''
+
+        holder = N.unpackbits(self._packets, axis=1)
+        return dict((node, N.flatnonzero(holder[i]).tolist()) for (i,
+                    node) in enumerate(self._csr.nodes))
 
     def get_distribution_time_stamps(self):
-        dist = []
-        for node in self._G.nodes():
-            ts = self._G.node[node]['time_stamp']
-            dist.append(len(ts))
-        time_stamps = dict([(x, dist.count(x)) for x in set(dist)])
-        return time_stamps
+        '''
+        Return the number of nodes holding x packets, for every x held by at
+        least one node
+        '''
+
+        return dict((x, int(count)) for (x, count) in
+                    enumerate(self._packet_histogram) if count > 0)
+
+    def get_packet_holders(self):
+        '''
+        Return the number of nodes holding every packet
+        '''
+
+        return self._packet_holders.copy()
+
+    def get_dissemination_times(self):
+        '''
+        Return the step at which every node held each packet, -1 for the
+        packets not fully disseminated yet
+        '''
+
+        return self._dissemination_time.copy()
+
+    def get_coverage_series(self):
+        '''
+        Return the fraction of the packets held by the nodes, out of
+        nb_node * buffer_size, at every step stored over the last
+        maxlen_queue steps
+        '''
+
+        return self._coverage.values()[:, 0] / float(self._nb_node
+                * self._buffer_size)
 
     def get_states(self):
-        states = {}
-        for node in self._G.nodes_iter():
-            states[node] = self._G.node[node]['state']
-        return states
+        return dict(zip(self._csr.nodes, [_STATE_LABELS[s] for s in
+                    self._infected]))
 
     def get_sent_update(self):
-        sent_update = {}
-        for nd in self._G.nodes_iter():
-            sent_update[nd] = self._G.node[nd]['ready_to_sent']
-        return sent_update
+        return dict(zip(self._csr.nodes, self._ready_to_sent.tolist()))
 
     def get_seeder(self):
-        #print self._infected_node
-        return self._infected_node
+        return [self._csr.nodes[i] for i in self._seeders]
     #
     # Reset
     #
 
     def reset_payoffs(self):
-        for nd in self._G.nodes_iter():
-            self._G.node[nd]['payoff'] = 0.0
+        self._payoffs.fill(0.0)
 
     def reset_payoffs_selected_player(self, player):
-        self._G.node[player]['payoff'] = 0.0
+        self._payoffs[self._csr.index[player]] = 0.0
 
     def reset_send_update(self):
-        for nd in self._G.nodes_iter():
-            self._G.node[nd]['ready_to_sent'] = 0
+        self._ready_to_sent.fill(0)
 
 
     #
@@ -307,40 +421,144 @@ class PGG_diffusion:
     #
 
     def compute_avg_payoffs(self):
-        avg_pay_c = 0
-        avg_pay_d = 0
-        avg_pay = 0
-        for node in self._G.nodes_iter():
-            avg_pay += self._G.node[node]['payoff']
-            if self._G.node[node]['strategy'] == 'C':
-                avg_pay_c += self._G.node[node]['payoff']
-            else:
-                avg_pay_d += self._G.node[node]['payoff']
+        cooperators = self._strategies == COOPERATOR
         nbcoop = self.cooperator_counter()
         if nbcoop != 0:
-            avg_pay_c = avg_pay_c / nbcoop
+            avg_pay_c = self._payoffs[cooperators].sum() / nbcoop
         else:
             avg_pay_c = 0
         nbdef = self.defector_counter()
         if nbdef != 0:
-            avg_pay_d = avg_pay_d / self.defector_counter()
+            avg_pay_d = self._payoffs[~cooperators].sum() / nbdef
         else:
             avg_pay_d = 0
-        avg_pay = avg_pay / len(self._G.nodes())
+        avg_pay = self._payoffs.sum() / self._nb_node
         return (avg_pay_c, avg_pay_d, avg_pay)
 
     def cooperator_counter(self):
-        return [self._G.node[i]['strategy'] for i in
-                self._G.nodes_iter()].count('C')
+        return self._nb_cooperator
 
     def store_cooperator_defector_counter(self):
-        self._nb_coop.append(self.cooperator_counter())
-        self._nb_def.append(self.defector_counter())
+        self._nb_coop.append(self._nb_cooperator)
 
     def defector_counter(self):
-        return [self._G.node[i]['strategy'] for i in
-                self._G.nodes_iter()].count('D')
+        return self._nb_node - self.cooperator_counter()
 
     def cooperator_in_neighborhood_counter(self, node):
-        return [self._G.node[neighbor]['strategy'] for neighbor in
-                self._G.neighbors_iter(node)].count('C')
+        return self._cooperator_in_neighborhood(self._csr.index[node])
+
+    # ####################
+    # Private Methodes
+    # ####################
+
+    def _compute_payoff(self, dealer, noise):
+        Nc = self._cooperator_in_neighborhood(dealer)
+        if self._is_sending_cooperator(dealer):
+            cost_y = 1.0/(Nc+1)
+        else:
+            cost_y = 0
+
+        cost_i = 0
+        for i in N.append(self._csr.neighbors(dealer), dealer):
+            if self._is_sending_cooperator(i):
+                Nj = self._cooperator_in_neighborhood(i)
+                cost_i += 1.0 / (Nj+1)
+
+        self._payoffs[dealer] = (float(self._synergy)/(Nc+1)) * cost_i - cost_y + noise
+
+    def _set_packets(self, i, packet_ids):
+        packet_ids = N.asarray(packet_ids, dtype=N.int64)
+        if N.any((packet_ids < 0) | (packet_ids >= self._buffer_size)):
+            raise ValueError('Packet ids must be in [0, buffer_size).')
+        holder = N.zeros(self._packets.shape[1] * 8, dtype=N.uint8)
+        holder[packet_ids] = 1
+        self._set_row(i, N.packbits(holder))
+
+    def _set_row(self, i, row):
+        '''
+        Replace the packets of the node of index i and update the counts
+        '''
+
+        (old, new) = (N.unpackbits(self._packets[i]), N.unpackbits(row))
+        self._packets[i] = row
+        holders = self._packet_holders
+        holders += (new[:self._buffer_size].astype(N.int64)
+                    - old[:self._buffer_size])
+        (nb_old, nb_new) = (self._nb_packets[i], int(new.sum()))
+        self._packet_histogram[nb_old] -= 1
+        self._packet_histogram[nb_new] += 1
+        self._nb_packets[i] = nb_new
+        self._nb_held += nb_new - nb_old
+        self._update_dissemination_time()
+
+    def _count_packets(self):
+        '''
+        Recount the packets from the bit matrix
+        '''
+
+        self._nb_packets[:] = _POPCOUNT[self._packets].sum(axis=1,
+                dtype=N.int64)
+        self._packet_histogram[:] = N.bincount(self._nb_packets,
+                minlength=self._buffer_size + 1)
+        self._packet_holders[:] = N.unpackbits(self._packets,
+                axis=1)[:, :self._buffer_size].sum(axis=0)
+        self._nb_held = int(self._nb_packets.sum())
+        self._update_dissemination_time()
+
+    def _deliver(self, receivers, pkt):
+        '''
+        Count the delivery of the packet pkt to the receivers, which did not
+        hold it
+        '''
+
+        N.subtract.at(self._packet_histogram, self._nb_packets[receivers], 1)
+        self._nb_packets[receivers] += 1
+        N.add.at(self._packet_histogram, self._nb_packets[receivers], 1)
+        self._packet_holders[pkt] += len(receivers)
+        self._nb_held += len(receivers)
+        if self._packet_holders[pkt] == self._nb_node:
+            self._dissemination_time[pkt] = self._simulation_time
+
+    def _update_dissemination_time(self):
+        full = self._packet_holders == self._nb_node
+        self._dissemination_time[~full] = -1
+        self._dissemination_time[full & (self._dissemination_time < 0)] = \
+            self._simulation_time
+
+    def _set_topology(self, G, nodes=None):
+        self._G = G
+        self._csr = CSRGraph(G, nodes)
+        self._adjacency = self._csr.adjacency()
+        self._group = self._csr.adjacency(self_loops=True)
+
+    def _select_seeders(self, seeders):
+        self._seeders = N.unique(N.asarray(seeders, dtype=N.int64))
+        for i in self._seeders:
+            self._set_row(i, self._full_row)
+
+    def _reseed(self):
+        seeders = self._seeders
+        self._nb_cooperator += len(seeders) - \
+            int(N.count_nonzero(self._strategies[seeders]))
+        self._strategies[seeders] = COOPERATOR
+        self._infected[seeders] = 1
+        self._ready_to_sent[seeders] = 1
+
+    def _is_diffusion_idle(self):
+        '''
+        Return True when no infected cooperator has a neighbor missing one
+        of its packets, i.e. the next diffusion step cannot deliver
+        '''
+
+        senders = N.flatnonzero(self._infected.astype(bool)
+                                & (self._strategies == COOPERATOR))
+        (src, edge) = self._csr.out_edges(senders)
+        dst = self._csr.indices[edge]
+        return not N.any(self._packets[src] & ~self._packets[dst])
+
+    def _cooperator_in_neighborhood(self, i):
+        return int(N.count_nonzero(self._strategies[self._csr.neighbors(i)]))
+
+    def _is_sending_cooperator(self, i):
+        return self._strategies[i] == COOPERATOR and \
+            self._ready_to_sent[i] == 1
@@ -68,15 +68,10 @@ def main():
                                   noise_var=noise_var)
             nb_coop = PGG.run_game(time_step)
             resultats.append(nb_coop)
-            strategies = PGG.get_strategies()
             first_run = False
         else:
-            PGG = PublicGoodGames(G=g, synergy=synergy,
-                                  cooperator_ratio=coop_ratio,
-                                  noise_var=noise_var)
-            PGG.set_strategies(strategies)
+            PGG.rebind(g)
             nb_coop = PGG.run_game(time_step)
-            strategies = PGG.get_strategies()
             resultats.append(nb_coop)
     plt.figure()
     plt.plot(resultats, '-o')
@@ -94,41 +94,17 @@ def main(parameters):
                                 buffer_size=buffer_size,
                                 nb_seeder=int(nb_seeder))
 
-            PGG.run_game()
+            res = PGG.run_game()
             nb_def.append(PGG.defector_counter())
             nb_coop.append(PGG.cooperator_counter())
-            strategies = PGG.get_strategies()
-            time_stamps = PGG.get_time_stamps()
-            states = PGG.get_states()
-            #sent_update = PGG.get_sent_update()
-            seeder = PGG.get_seeder()
-            #print time_stamps[0]
-            #print sent_update
-            #print strategies
-            #print states
             first_run = False
         else:
-            PGG = PGG_diffusion(G=g, synergy=synergy,
-                                cooperator_ratio=coop_ratio,
-                                buffer_size=buffer_size,
-                                noise_var=noise_var)
-            PGG.set_strategies(strategies)
-            PGG.set_time_stamps(time_stamps)
-            PGG.set_nodes_states(states)
-            #PGG.set_sent_update(sent_update)
-            PGG.set_seeder(seeder)
+            # Keep the strategies, packets, states and seeders of the nodes
+            # and only swap the topology for the one of the new slice
+            PGG.rebind(g)
             res = PGG.run_game()
             nb_def.append(PGG.defector_counter())
             nb_coop.append(PGG.cooperator_counter())
-            strategies = PGG.get_strategies()
-            time_stamps = PGG.get_time_stamps()
-            states = PGG.get_states()
-            #print states
-            #print strategies
-            #print time_stamps[0]
-            #sent_update = PGG.get_sent_update()
-            #seeder = PGG.get_seeder()
-            #print seeder
     print synergy, res, np.mean(G.avg_degree())
     plt.figure()
     plt.plot(nb_def,'b-*')
@@ -15,7 +15,7 @@ setup(
       author_email='vgauthier@luxbulb.org',
       url='http://bitbucket.org/vgauthier/complex-systems/',
       keywords=["complex systems", "Levy flight", "human mobility"],
-      requires=['numpy','pylab'],
+      requires=['numpy','scipy','pylab'],
       license='MIT',
       tests_require=['nose'],
       test_suite = 'nose.collector',
@@ -30,6 +30,7 @@ setup(
                    'Intended Audience :: Science/Research'
                    ],
       install_requires=[
-                        "numpy >= 1.4.0"
+                        "numpy >= 1.4.0",
+                        "scipy"
                         ]
       )
@@ -146,15 +146,10 @@ def run_simu(parameters, synergy):
                                   noise_var=noise_var)
             nb_coop = PGG.run_game(sampling_interval)
             resultats.append(nb_coop)
-            strategies = PGG.get_strategies()
             first_run = False
         else:
-            PGG = PublicGoodGames(G=g, synergy=synergy,
-                                  cooperator_ratio=coop_ratio,
-                                  noise_var=noise_var)
-            PGG.set_strategies(strategies)
+            PGG.rebind(g)
             nb_coop = PGG.run_game(sampling_interval)
-            strategies = PGG.get_strategies()
             resultats.append(nb_coop)
 
     return (synergy, nb_coop, np.mean(G.avg_degree()))
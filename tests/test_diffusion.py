@@ -0,0 +1,153 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# -------------------------------------------------------------------------------
+# Copyright (c) 2012 Vincent Gauthier.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+# -------------------------------------------------------------------------------
+
+from complex_systems.diffusion import Diffusion, GillespieDiffusion, \
+    reachability
+import unittest
+
+
+class test_Diffusion(unittest.TestCase):
+
+    def setUp(self):
+        import networkx as nx
+
+        self.G = nx.path_graph(4)
+        for (u, v) in self.G.edges():
+            self.G.edge[u][v]['weight'] = 1.0
+
+    def test_diffusion_step(self):
+        D = Diffusion(G=self.G, time_step=1.0, nb_simulation_step=1,
+                      initial_time_stamp=2.0)
+        D.set_infected(0)
+        D.set_weight({(2, 3): 0.0})
+        for i in range(3):
+            D.diffusion_step()
+        self.assertDictEqual({0: 'I', 1: 'I', 2: 'I', 3: 'S'},
+                             D.get_states())
+        self.assertEqual(3, D.get_number_infected())
+        self.assertEqual(2.0, D.get_time_stamps()[2])
+
+    def test_run_steps_list(self):
+        D = Diffusion(G=self.G, time_step=1.0, nb_simulation_step=2)
+        D.run_steps([0, 3])
+        self.assertEqual(4, D.get_number_infected())
+        self.assertEqual(2.0, D.get_time_stamps()[3])
+
+    def test_time_stamp_propagation(self):
+        D = Diffusion(G=self.G, time_step=1.0, nb_simulation_step=1,
+                      seed=0)
+        D.set_node_time_stamps({0: 1.0, 1: 3.0, 2: 0.0, 3: 0.0})
+        D.set_nodes_states({0: 'I', 1: 'I', 2: 'S', 3: 'S'})
+        D.diffusion_step()
+        self.assertDictEqual({0: 3.0, 1: 3.0, 2: 3.0, 3: 0.0},
+                             D.get_time_stamps())
+        D.diffusion_step()
+        D.diffusion_step()
+        self.assertEqual(4, D.get_number_infected())
+        self.assertEqual(0, len(D._frontier))
+
+    def test_gillespie(self):
+        results = []
+        for model in (Diffusion, GillespieDiffusion):
+            D = model(G=self.G, time_step=1.0, nb_simulation_step=3,
+                      initial_time_stamp=2.0, seed=0)
+            D.set_weight({(2, 3): 0.0})
+            D.run_steps(0)
+            results.append((D.get_states(), D.get_time_stamps()))
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(3, D.get_time())
+        D.set_weight({(2, 3): 0.5})
+        D.advance(1000)
+        self.assertEqual(4, D.get_number_infected())
+
+    def test_gillespie_law(self):
+        import networkx as nx
+        import numpy as N
+
+        # One hop per step on weight 1 edges
+
+        G = nx.path_graph(30)
+        for model in (Diffusion, GillespieDiffusion):
+            D = model(G=G, time_step=1.0, nb_simulation_step=1)
+            D.set_weight(dict((edge, 1.0) for edge in G.edges()))
+            D.set_infected(0)
+            D.diffusion_step()
+            self.assertEqual(2, D.get_number_infected())
+
+        # Same mean number of infected nodes with weights 0.5
+
+        G = nx.path_graph(6)
+        means = []
+        for model in (Diffusion, GillespieDiffusion):
+            counts = []
+            for seed in range(2000):
+                D = model(G=G, time_step=1.0, nb_simulation_step=1,
+                          seed=seed)
+                D.set_weight(dict((edge, 0.5) for edge in G.edges()))
+                D.set_infected(0)
+                for i in range(4):
+                    D.diffusion_step()
+                counts.append(D.get_number_infected())
+            means.append(N.mean(counts))
+        self.assertAlmostEqual(3.0, means[0], delta=0.1)
+        self.assertAlmostEqual(means[0], means[1], delta=0.1)
+
+    def test_rebind(self):
+        import networkx as nx
+
+        D = Diffusion(G=self.G, time_step=1.0, nb_simulation_step=1,
+                      strategies={0: 'C', 1: 'D', 2: 'C', 3: 'C'})
+        D.set_infected(0)
+        D.diffusion_step()
+        D.rebind(nx.star_graph(3))
+        self.assertDictEqual({0: 'I', 1: 'I', 2: 'S', 3: 'S'},
+                             D.get_states())
+        D.diffusion_step()
+        self.assertEqual(4, D.get_number_infected())
+
+    def test_reachability(self):
+        import networkx as nx
+        import numpy as N
+
+        G = nx.path_graph(70)
+        (reach, first_step) = reachability(G, nb_step=80)
+        distance = N.abs(N.arange(70)[:, None] - N.arange(70))
+        self.assertTrue(N.all(reach))
+        self.assertTrue(N.all(distance == first_step))
+
+        strategies = dict((node, 'C') for node in self.G.nodes())
+        strategies[1] = 'D'
+        (reach, first_step) = reachability([self.G, nx.star_graph(3)],
+                nb_step=3, sources=[0, 3], strategies=strategies)
+        self.assertTrue(N.all(reach))
+        self.assertEqual([[0, 1, 4, 4], [4, 2, 1, 0]], first_step.tolist())
+        (reach, first_step) = reachability(self.G, nb_step=3, sources=[3],
+                strategies=strategies)
+        self.assertEqual([[False, True, True, True]], reach.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -88,5 +88,24 @@ class test_DyGraph(unittest.TestCase):
         self.assertEqual(N.ceil(100.0 / 10.0),
                          len(self.dygraph._slices))
 
+    def test_iter_mobility(self):
+        self.dygraph = DyGraph(time_stop=100.0, time_step=10.0)
+        slice_time = []
+        for g in self.dygraph.iter_mobility_levy_walk(
+            alpha=0.9,
+            beta=0.9,
+            size_max=100,
+            f_min=10,
+            f_max=100,
+            s_min=1,
+            s_max=100,
+            b_c=2,
+            radius=20.0,
+            nb_node=10,
+            ):
+            self.assertEqual(10, len(g))
+            slice_time.append(g.graph['slice_time'])
+        self.assertEqual(list(self.dygraph.get_slice_time()), slice_time)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
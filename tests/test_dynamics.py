@@ -0,0 +1,67 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# -------------------------------------------------------------------------------
+# Copyright (c) 2012 Vincent Gauthier.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+# -------------------------------------------------------------------------------
+
+from complex_systems.csr_graph import CSRGraph
+from complex_systems.dynamics import fermi_update, PayoffNoise
+import numpy as N
+import unittest
+
+
+class test_fermi_update(unittest.TestCase):
+
+    def setUp(self):
+        import networkx as nx
+
+        self.csr = CSRGraph(nx.star_graph(4))
+        self.strategies = N.array([1, 0, 0, 0, 0], dtype=N.int8)
+
+    def test_imitate_better_neighbor(self):
+        payoffs = N.array([10.0, 0.0, 0.0, 0.0, 0.0])
+        out = N.empty_like(self.strategies)
+        fermi_update(self.csr, self.strategies, payoffs, 1e-3, out)
+        self.assertEqual([1, 1, 1, 1, 1], out.tolist())
+        self.assertEqual([1, 0, 0, 0, 0], self.strategies.tolist())
+
+    def test_ignore_worse_neighbor(self):
+        payoffs = N.array([-10.0, 0.0, 0.0, 0.0, 0.0])
+        out = N.empty_like(self.strategies)
+        fermi_update(self.csr, self.strategies, payoffs, 1e-3, out)
+        self.assertEqual([0, 0, 0, 0, 0], out.tolist())
+
+
+class test_PayoffNoise(unittest.TestCase):
+
+    def test_next(self):
+        noise = PayoffNoise(2.0, (3, 100), N.random.RandomState(1),
+                            max_block_size=1000)
+        steps = [noise.next().copy() for i in range(10)]
+        self.assertEqual((3, 100), steps[0].shape)
+        self.assertFalse(N.allclose(steps[0], steps[3]))
+        self.assertAlmostEqual(2.0, N.std(steps), places=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
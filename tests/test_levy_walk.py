@@ -25,7 +25,8 @@ __author__ = """\n""".join(['Vincent Gauthier <vgauthier@luxbulb.org>'])
 
 __all__ = ['test_levy_walk']
 
-from complex_systems.mobility.levy_walk import levy_walk
+from complex_systems.mobility.levy_walk import levy_walk, levy_walks, \
+    resample, iter_levy_walks
 import unittest
 import logging
 import sys
@@ -154,6 +155,73 @@ class test_levy_walk(unittest.TestCase):
             print 'NB SAMPLE', int(N.ceil(duration/sample_length)), len(set(T))
             self.assertEqual(N.ceil(duration/sample_length), len(list(set(T))))
 
+    def test_levy_walks(self):
+        import numpy as N
+        for b_c in (1, 2):
+            positions = levy_walks(
+                nb_node=20,
+                alpha=0.66,
+                beta=0.99,
+                sample_length=10.0,
+                size_max=500,
+                velocity=1.0,
+                f_min=8,
+                f_max=83000,
+                s_min=0.8,
+                s_max=430,
+                duration=1000.0,
+                b_c=b_c,
+                )
+            self.assertEqual((20, 100, 2), positions.shape)
+            self.assertTrue(N.all((positions >= 0) & (positions <= 500)))
+
+        # The samplers of the walk are seeded from numpy.random
+
+        walks = []
+        for i in range(2):
+            N.random.seed(1)
+            walks.append(levy_walks(nb_node=5, alpha=0.66, beta=0.99,
+                         sample_length=10.0, size_max=500, velocity=1.0,
+                         f_min=8, f_max=83000, s_min=0.8, s_max=430,
+                         duration=200.0))
+        self.assertEqual(walks[0].tolist(), walks[1].tolist())
+
+    def test_resample(self):
+        import numpy as N
+        waypoints = N.array([[[0.0, 0.0], [10.0, 0.0], [10.0, 0.0]]])
+        times = N.array([[0.0, 10.0, 15.0]])
+        positions = resample(waypoints, times, [5.0, 12.0, 20.0])
+        self.assertEqual([[[5.0, 0.0], [10.0, 0.0], [10.0, 0.0]]],
+                         positions.tolist())
+        positions = resample(waypoints, times, [5.0, 12.0], size_max=8,
+                             b_c=2)
+        self.assertEqual([[[5.0, 0.0], [6.0, 0.0]]], positions.tolist())
+        positions = resample(waypoints, times, [5.0, 12.0], size_max=8,
+                             b_c=1)
+        self.assertEqual([[[5.0, 0.0], [2.0, 0.0]]], positions.tolist())
+
+    def test_iter_levy_walks(self):
+        import numpy as N
+        walks = iter_levy_walks(
+            nb_node=20,
+            alpha=0.66,
+            beta=0.99,
+            sample_length=10.0,
+            size_max=500,
+            velocity=1.0,
+            f_min=8,
+            f_max=83000,
+            s_min=0.8,
+            s_max=430,
+            duration=1000.0,
+            b_c=2,
+            chunk_size=4,
+            )
+        (T, positions) = zip(*walks)
+        self.assertEqual(list(N.arange(100) * 10.0), list(T))
+        positions = N.array(positions)
+        self.assertEqual((100, 20, 2), positions.shape)
+        self.assertTrue(N.all((positions >= 0) & (positions <= 500)))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,201 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# -------------------------------------------------------------------------------
+# Copyright (c) 2012 Vincent Gauthier.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+# -------------------------------------------------------------------------------
+
+from complex_systems.pgg import PublicGoodGames
+from complex_systems.dynamics import EarlyStop
+import numpy as N
+import unittest
+
+
+class test_PublicGoodGames(unittest.TestCase):
+
+    def setUp(self):
+        import networkx as nx
+
+        self.G = nx.star_graph(3)
+        self.strategies = {0: 'C', 1: 'C', 2: 'D', 3: 'D'}
+
+    def test_get_set_strategies(self):
+        PGG = PublicGoodGames(G=self.G, synergy=2.0)
+        PGG.set_strategies(self.strategies)
+        self.assertDictEqual(self.strategies, PGG.get_strategies())
+        self.assertEqual(2, PGG.cooperator_counter())
+        self.assertEqual(2, PGG.defector_counter())
+
+    def test_compute_payoffs(self):
+        PGG = PublicGoodGames(G=self.G, synergy=2.0)
+        PGG.set_strategies(self.strategies)
+        for node in self.G.nodes():
+            PGG.compute_payoffs(node)
+        payoffs = PGG.get_payoffs()
+        self.assertAlmostEqual(2.0 * (1.0 / 4 + 1.0 / 2) - 1, payoffs[0])
+        self.assertAlmostEqual(2.0 * (1.0 / 4 + 1.0 / 2) - 1, payoffs[1])
+        self.assertAlmostEqual(2.0 * (1.0 / 4), payoffs[2])
+
+    def test_compute_all_payoffs(self):
+        import networkx as nx
+        G = nx.fast_gnp_random_graph(50, 0.1)
+        PGG = PublicGoodGames(G=G, synergy=3.0, cooperator_ratio=0.5)
+        for node in G.nodes():
+            PGG.compute_payoffs(node)
+        expected = PGG.get_payoffs()
+        PGG.compute_all_payoffs()
+        payoffs = PGG.get_payoffs()
+        for node in G.nodes():
+            self.assertAlmostEqual(expected[node], payoffs[node])
+
+    def test_absorbing_state(self):
+        PGG = PublicGoodGames(G=self.G, synergy=2.0,
+                              cooperator_ratio=1.0)
+        self.assertEqual(1.0, PGG.run_game(10))
+        PGG = PublicGoodGames(G=self.G, synergy=2.0,
+                              cooperator_ratio=0.0)
+        self.assertEqual(0.0, PGG.run_game(10))
+
+    def test_replica_ensemble(self):
+        import networkx as nx
+        G = nx.fast_gnp_random_graph(50, 0.1)
+        PGG = PublicGoodGames(G=G, synergy=3.0, cooperator_ratio=0.5,
+                              nb_replica=4)
+        PGG.set_strategies(dict((node, 'C') for node in G.nodes()),
+                           replica=2)
+        coop = PGG.run_game(5)
+        self.assertEqual((4, ), coop.shape)
+        self.assertEqual(1.0, coop[2])
+        self.assertEqual((4, ), PGG.cooperator_counter().shape)
+
+    def test_synergy_range(self):
+        import networkx as nx
+        G = nx.fast_gnp_random_graph(50, 0.1)
+        PGG = PublicGoodGames(G=G, synergy=[0.0, 2.0, 4.0],
+                              cooperator_ratio=0.5, nb_replica=2)
+        self.assertEqual([[0.0, 0.0], [2.0, 2.0], [4.0, 4.0]],
+                         PGG.get_synergy().tolist())
+        coop = PGG.run_game(5)
+        self.assertEqual((3, 2), coop.shape)
+
+        PGG = PublicGoodGames(G=G, synergy=[0.0, 2.0, 4.0],
+                              cooperator_ratio=1.0)
+        PGG.compute_all_payoffs()
+        payoffs = PGG._payoffs
+        self.assertTrue(N.allclose(-1.0, payoffs[0]))
+        self.assertTrue(N.allclose(2.0 * payoffs[1] + 1.0, payoffs[2]))
+        self.assertEqual((3, ), PGG.run_game(5).shape)
+
+    def test_counter_series(self):
+        import networkx as nx
+        G = nx.fast_gnp_random_graph(50, 0.1)
+        PGG = PublicGoodGames(G=G, synergy=3.0, cooperator_ratio=0.5,
+                              maxlen_queue=4, nb_replica=3)
+        PGG.run_game(10)
+        strategies = PGG.get_strategies(replica=1)
+        self.assertEqual(strategies.values().count('C'),
+                         PGG.cooperator_counter()[1])
+        self.assertEqual((4, 3), PGG.get_cooperator_series().shape)
+        self.assertTrue(N.all(50 == PGG.get_cooperator_series()
+                        + PGG.get_defector_series()))
+
+    def test_early_stop(self):
+        import networkx as nx
+        G = nx.fast_gnp_random_graph(50, 0.1)
+        PGG = PublicGoodGames(G=G, synergy=3.0, cooperator_ratio=0.0,
+                              early_stop=EarlyStop())
+        self.assertEqual(0.0, PGG.run_game(1000))
+        self.assertEqual((EarlyStop.ABSORBING, 1), PGG.get_stop_reason())
+
+        PGG = PublicGoodGames(G=G, synergy=3.0, cooperator_ratio=0.5,
+                              maxlen_queue=10, early_stop=EarlyStop(
+                              absorbing=False, tolerance=2.0))
+        PGG.run_game(1000)
+        self.assertEqual((EarlyStop.STATIONARY, 10), PGG.get_stop_reason())
+
+        PGG = PublicGoodGames(G=G, synergy=3.0, cooperator_ratio=0.5)
+        PGG.run_game(20)
+        self.assertEqual((None, 20), PGG.get_stop_reason())
+
+    def test_santos_payoffs(self):
+        import networkx as nx
+        G = nx.fast_gnp_random_graph(50, 0.1)
+        PGG = PublicGoodGames(G=G, synergy=[3.0, 5.0],
+                              cooperator_ratio=0.5, payoff='santos')
+        for node in G.nodes():
+            PGG.compute_payoffs_santos(node)
+        expected = PGG._payoffs.copy()
+        PGG.compute_all_payoffs()
+        self.assertTrue(N.allclose(expected, PGG._payoffs))
+        self.assertRaises(ValueError, PublicGoodGames, G=G, synergy=3.0,
+                          payoff='global')
+
+    def test_seed(self):
+        import networkx as nx
+        G = nx.fast_gnp_random_graph(50, 0.1)
+        results = [PublicGoodGames(G=G, synergy=3.0, cooperator_ratio=0.5,
+                   noise_var=1.0, nb_replica=2, seed=42).run_game(20)
+                   for i in range(2)]
+        self.assertEqual(results[0].tolist(), results[1].tolist())
+
+    def test_asynchronous_update(self):
+        import networkx as nx
+        G = nx.fast_gnp_random_graph(50, 0.1)
+        for payoff in ('local', 'santos'):
+            PGG = PublicGoodGames(G=G, synergy=3.0, cooperator_ratio=0.5,
+                                  payoff=payoff, update='asynchronous')
+            coop = PGG.run_game(10)
+            self.assertTrue(0.0 <= coop <= 1.0)
+            self.assertEqual(PGG.get_strategies().values().count('C'),
+                             PGG.cooperator_counter())
+            payoffs = [PGG._asynchronous_payoff(i) for i in range(50)]
+            PGG.compute_all_payoffs()
+            self.assertTrue(N.allclose(PGG._payoffs[0], payoffs))
+        self.assertRaises(ValueError, PublicGoodGames, G=G, synergy=3.0,
+                          nb_replica=2, update='asynchronous')
+
+    def test_rebind(self):
+        import networkx as nx
+
+        PGG = PublicGoodGames(G=self.G, synergy=2.0)
+        PGG.set_strategies(self.strategies)
+        PGG.rebind(nx.path_graph(4))
+        self.assertDictEqual(self.strategies, PGG.get_strategies())
+        PGG.compute_all_payoffs()
+        fresh = PublicGoodGames(G=nx.path_graph(4), synergy=2.0)
+        fresh.set_strategies(self.strategies)
+        fresh.compute_all_payoffs()
+        self.assertDictEqual(fresh.get_payoffs(), PGG.get_payoffs())
+        self.assertRaises(ValueError, PGG.rebind, nx.path_graph(5))
+
+        # The counters restart with the new slice
+
+        PGG = PublicGoodGames(G=self.G, synergy=2.0)
+        PGG.set_strategies(dict((node, 'C') for node in self.G.nodes()))
+        self.assertEqual(1.0, PGG.run_game(10))
+        PGG.set_strategies(dict((node, 'D') for node in self.G.nodes()))
+        PGG.rebind(nx.path_graph(4))
+        self.assertEqual(0.0, PGG.run_game(10))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# -------------------------------------------------------------------------------
+# Copyright (c) 2012 Vincent Gauthier.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+# -------------------------------------------------------------------------------
+
+from complex_systems.pgg_diffusion import PGG_diffusion
+import unittest
+
+
+class test_PGG_diffusion(unittest.TestCase):
+
+    def setUp(self):
+        import networkx as nx
+
+        self.G = nx.fast_gnp_random_graph(60, 0.1)
+
+    def test_get_set_strategies(self):
+        PGG = PGG_diffusion(G=self.G, synergy=5.0, cooperator_ratio=0.5)
+        strategies = dict((node, 'D') for node in self.G.nodes())
+        strategies[3] = 'C'
+        PGG.set_strategies(strategies)
+        self.assertDictEqual(strategies, PGG.get_strategies())
+        self.assertEqual(1, PGG.cooperator_counter())
+
+    def test_run_game(self):
+        PGG = PGG_diffusion(G=self.G, synergy=5.0, cooperator_ratio=0.5,
+                            nb_simulation_step=5, buffer_size=10,
+                            temperature=0.5)
+        coop = PGG.run_game()
+        self.assertTrue(0.0 <= coop <= 1.0)
+        seeder = PGG.get_seeder()[0]
+        self.assertEqual('C', PGG.get_strategies()[seeder])
+        self.assertEqual(range(10), PGG.get_time_stamps()[seeder])
+        self.assertEqual(PGG.get_strategies().values().count('C'),
+                         PGG.cooperator_counter())
+        self.assertEqual(5, len(PGG.get_cooperator_series()))
+
+    def test_packet_buffers(self):
+        PGG = PGG_diffusion(G=self.G, synergy=5.0, buffer_size=20)
+        PGG.set_seeder([])
+        time_stamps = dict((node, []) for node in self.G.nodes())
+        time_stamps[1] = [0, 7, 8, 19]
+        time_stamps[2] = [3]
+        PGG.set_time_stamps(time_stamps)
+        self.assertDictEqual(time_stamps, PGG.get_time_stamps())
+        self.assertDictEqual({0: 58, 1: 1, 4: 1},
+                             PGG.get_distribution_time_stamps())
+        self.assertEqual(3, PGG._packets.shape[1])
+        time_stamps[1] = [20]
+        self.assertRaises(ValueError, PGG.set_time_stamps, time_stamps)
+
+    def test_seeder(self):
+        PGG = PGG_diffusion(G=self.G, synergy=5.0, buffer_size=10,
+                            nb_seeder=3)
+        self.assertEqual(3, len(PGG.get_seeder()))
+        PGG.set_seeder([4, 2])
+        self.assertEqual([2, 4], PGG.get_seeder())
+        PGG.set_time_stamps(dict((node, []) for node in self.G.nodes()))
+        time_stamps = PGG.get_time_stamps()
+        self.assertEqual(range(10), time_stamps[2])
+        self.assertEqual(range(10), time_stamps[4])
+        PGG.run_game(2)
+        self.assertEqual('C', PGG.get_strategies()[4])
+        self.assertEqual('I', PGG.get_states()[4])
+
+    def test_dissemination_progress(self):
+        import numpy as N
+
+        PGG = PGG_diffusion(G=self.G, synergy=5.0, cooperator_ratio=1.0,
+                            buffer_size=12, nb_seeder=2)
+        PGG.run_game(8)
+        time_stamps = PGG.get_time_stamps()
+        counts = [len(val) for val in time_stamps.values()]
+        self.assertDictEqual(dict((x, counts.count(x)) for x in
+                             set(counts)), PGG.get_distribution_time_stamps())
+        holders = [sum(pkt in val for val in time_stamps.values()) for pkt in
+                   range(12)]
+        self.assertEqual(holders, PGG.get_packet_holders().tolist())
+        times = PGG.get_dissemination_times()
+        self.assertTrue(N.all((times == -1) == (N.array(holders) < 60)))
+        coverage = PGG.get_coverage_series()
+        self.assertEqual(8, len(coverage))
+        self.assertTrue(N.all(N.diff(coverage) >= 0))
+        self.assertAlmostEqual(sum(counts) / (60 * 12.0), coverage[-1])
+
+    def test_diffusion_idle(self):
+        import networkx as nx
+
+        PGG = PGG_diffusion(G=nx.path_graph(2), synergy=5.0, buffer_size=4)
+        PGG.set_seeder([])
+        PGG.set_time_stamps({0: [1], 1: []})
+        PGG.set_nodes_states({0: 'I', 1: 'S'})
+        PGG.set_strategies({0: 'D', 1: 'D'})
+        self.assertTrue(PGG._is_diffusion_idle())
+
+        # A node turning cooperator can send its packet at the next step
+
+        PGG.set_strategies({0: 'C', 1: 'D'})
+        self.assertFalse(PGG._is_diffusion_idle())
+        PGG.set_time_stamps({0: [1], 1: [1]})
+        self.assertTrue(PGG._is_diffusion_idle())
+
+    def test_all_payoffs(self):
+        import numpy as N
+
+        PGG = PGG_diffusion(G=self.G, synergy=5.0, cooperator_ratio=0.5)
+        sent_update = dict((node, node % 3 == 0) for node in self.G.nodes())
+        PGG.set_sent_update(sent_update)
+        for node in self.G.nodes():
+            PGG.compute_payoffs(node)
+        payoffs = PGG.get_payoffs()
+        PGG.reset_payoffs()
+        PGG.compute_all_payoffs()
+        batch = PGG.get_payoffs()
+        self.assertTrue(N.allclose([payoffs[node] for node in
+                        self.G.nodes()], [batch[node] for node in
+                        self.G.nodes()]))
+
+    def test_rebind(self):
+        import networkx as nx
+
+        PGG = PGG_diffusion(G=self.G, synergy=5.0, cooperator_ratio=0.5,
+                            buffer_size=10)
+        PGG.run_game(3)
+        (strategies, time_stamps) = (PGG.get_strategies(),
+                                     PGG.get_time_stamps())
+        H = nx.fast_gnp_random_graph(60, 0.1)
+        PGG.rebind(H)
+        self.assertDictEqual(strategies, PGG.get_strategies())
+        self.assertDictEqual(time_stamps, PGG.get_time_stamps())
+        self.assertEqual(sorted(H.neighbors(0)),
+                         sorted(PGG._csr.neighbors(0)))
+        PGG.run_game(3)
+        self.assertEqual(3, len(PGG.get_cooperator_series()))
+        self.assertEqual(3, len(PGG.get_coverage_series()))
+
+
+if __name__ == '__main__':
+    unittest.main()
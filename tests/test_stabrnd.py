@@ -26,7 +26,8 @@ __author__ = """\n""".join(['Vincent Gauthier <vgauthier@luxbulb.org>'])
 __all__ = ['test_stabrnd']
 
 
-from complex_systems.mobility.stabrnd import stabrnd 
+from complex_systems.mobility.stabrnd import stabrnd, truncated_stabrnd, \
+    StableSampler
 import numpy as N
 import unittest
 
@@ -40,6 +41,73 @@ class test_stabrnd(unittest.TestCase):
         N.random.seed(123456)
         test = stabrnd(0.8, 0, 1, 0, 3, 1)
         self.assertEqual(result.all(), test.all())
-    
+
+    def test_truncated_stabrnd(self):
+        test = truncated_stabrnd(0.66, 0, 10.0, 0, 100, 110, (50, 2),
+                                 absolute=True)
+        self.assertEqual((50, 2), test.shape)
+        self.assertTrue(N.all((test > 100) & (test < 110)))
+        self.assertRaises(ValueError, truncated_stabrnd, 3, 0, 1, 0, 0, 1,
+                          10)
+        self.assertRaises(ValueError, truncated_stabrnd, 1, 0, 1, 0, 1, 1,
+                          10)
+        self.assertRaises(ValueError, truncated_stabrnd, 0.66, 0, 10.0, 0,
+                          -5, -1, 10, absolute=True)
+        self.assertRaises(ValueError, truncated_stabrnd, 2, 0, 1, 0, 100,
+                          101, 10, max_batch=1000)
+        (first, second) = [truncated_stabrnd(0.66, 0, 10.0, 0, 8, 83000,
+                           100, absolute=True,
+                           sampler=StableSampler(0.66, 0, 10.0, 0,
+                           seed=1)) for i in range(2)]
+        self.assertTrue(N.all((first > 8) & (first < 83000)))
+        self.assertEqual(first.tolist(), second.tolist())
+
+    def test_stable_sampler(self):
+        for (alpha, beta) in [(0.8, 0), (1.5, 0.5), (2, 0), (1, 0)]:
+            N.random.seed(123456)
+            result = stabrnd(alpha, beta, 2.0, 1.0, 20, 1).ravel()
+            sampler = StableSampler(alpha, beta, 2.0, 1.0, seed=123456)
+            test = N.empty((4, 5))
+            self.assertTrue(test is sampler.sample(out=test))
+            self.assertTrue(N.allclose(result, test.ravel()))
+        self.assertRaises(ValueError, sampler.sample, out=N.empty((10,
+                          10)).T)
+        self.assertRaises(ValueError, sampler.sample, out=N.empty(10,
+                          dtype=N.float32))
+        self.assertRaises(ValueError, StableSampler, 3, 0, 1, 0)
+        self.assertRaises(ValueError, StableSampler, 1, 0, -1, 0)
+        self.assertRaises(ValueError, StableSampler, 1, 0.5, 1, 0,
+                          table_size=1000)
+
+    def test_stable_sampler_table(self):
+        exact = StableSampler(0.8, 0, 1, 0, seed=1).sample(20000)
+        sampler = StableSampler(0.8, 0, 1, 0, seed=2, table_size=2 ** 16)
+        self.assertTrue(sampler.table_error() < 0.01)
+        test = sampler.sample(20000)
+        for q in [10, 25, 50, 75, 90]:
+            self.assertAlmostEqual(q / 100.0, N.mean(test
+                                   < N.percentile(exact, q)), delta=0.02)
+
+    def test_stable_sampler_tail(self):
+
+        # Tail mass beyond the exact quantiles of the Cauchy case (alpha = 1)
+        # and beyond the ones of an exact sample
+
+        sampler = StableSampler(1, 0, 1, 0, seed=1, table_size=2 ** 16)
+        test = N.abs(sampler.sample(10 ** 6))
+        for p in [1e-3, 1e-4]:
+            self.assertAlmostEqual(p, N.mean(test > N.tan(N.pi / 2 * (1
+                                   - p))), delta=p / 4)
+        exact = N.abs(StableSampler(0.66, 0, 1, 0, seed=1).sample(10
+                      ** 6))
+        sampler = StableSampler(0.66, 0, 1, 0, seed=2, table_size=2 ** 16)
+        test = N.abs(sampler.sample(10 ** 6))
+        self.assertAlmostEqual(1e-3, N.mean(test > N.percentile(exact,
+                               99.9)), delta=2e-4)
+        self.assertTrue(N.all(sampler._draw_tail(1000, sampler._tails[1])
+                        > sampler._tails[1][0]))
+        self.assertRaises(ValueError, StableSampler, 1, 0, 1, 0,
+                          table_size=2, tail=0.5)
+
 if __name__ == '__main__':
     unittest.main()